@@ -7,36 +7,59 @@ from pathlib import Path
 from shiny import App, Inputs, Outputs, Session, ui
 
 # Load libraries
+#only what the server uses (pandas, plotly, and shiny); the seaborn/matplotlib EDA plots live in
+  #code/_00_power_eda and are never imported here
+import functools
+import os
 import sys
-import numpy as np
-import pandas as pd
-import inflection
-import re
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pickle
 import shiny
 from shiny import reactive
 from shiny.express import render, ui
-from shinywidgets import output_widget, render_widget
-import plotly.tools as tls
-import plotly.express as px
+from shinywidgets import output_widget, render_widget, as_widget
 
 
-# Import and wrangle data
-root = '/Users/keithpost/Documents/Python/Python projects/power_dash_py/'
-df = pd.read_pickle(root + 'data/openipf-2024-10-12_filtered_wrangled')
-#successful lifts only
-df = df[df['mass_kg']>0]
-
-
-# Add 'code' folder to Python path
-sys.path.append('./code')
+# Make 'code' folder importable
+#relative to this file rather than the working dir (no __file__ when quarto runs this chunk, which
+  #it does from the project dir)
+file_app = os.path.realpath(globals().get('__file__', 'app.py'))
+dir_code = os.path.join(os.path.dirname(file_app), 'code')
+if dir_code not in sys.path:
+  sys.path.insert(0, dir_code)
 
 
 
 # Import functions
-from _00_power_fns import make_hist_shiny, make_scatter_shiny, make_boxplot_shiny
+from _00_power_fns import index_lifts, index_lift_years, summarize_lift
+from _00_power_fns import load_figures
+from _00_power_data import load_dash_data, path_dash_data, read_config
+from _00_power_dash import path_figs, dash_outputs
+from _00_power_offload import render_figure
+from _00_power_inputs import resolve_lift, settle
+from _00_power_metrics import instrument_output, add_timings, render_stats, start_metrics
+
+
+# Import data
+#dataset from config (POWER_DASH_DATA or power_dash.json; default: data/ in the repo); successful
+  #lifts only and only the cols used by the dashboard, validated and memory-mapped once per process
+  #and shared read-only by all sessions
+path_data = path_dash_data()
+df = load_dash_data()
+
+#index by lift and by lift x year (built once; each output gets a view instead of masking df)
+df_lifts = index_lifts(df)
+df_lift_years = index_lift_years(df_lifts)
+years = sorted({year for lift, year in df_lift_years if year is not None})
+
+#figures rendered ahead of deploy (python code/_00_power_dash.py <data>); others render live
+load_figures(path_figs(path_data), df_lifts)
+
+#render metrics: timings by output and phase (reported as a periodic log summary or a Prometheus
+  #endpoint if POWER_DASH_METRICS is 'log' or 'prometheus')
+start_metrics()
+
+#seconds the lift selectors must hold before the outputs render (POWER_DASH_INPUT_DEBOUNCE or
+  #power_dash.json; 0 = none)
+input_debounce = read_config()['input_debounce']
 
 # ========================================================================
 
@@ -46,16 +69,14 @@ from _00_power_fns import make_hist_shiny, make_scatter_shiny, make_boxplot_shin
 def server(input: Inputs, output: Outputs, session: Session) -> None:
     @render.text
     def min_text_output():
-      df_lift = df[(df['lift']==exact_lift()) & (df['mass_kg']>0)]
-      min_lift = df_lift['mass_kg'].min() 
+      min_lift = lift_data()['min']
       return str(min_lift) + " kg"
 
     # ========================================================================
 
     @render.text
     def max_text_output():
-      df_lift = df[df['lift']==exact_lift()]
-      max_lift = df_lift['mass_kg'].max() 
+      max_lift = lift_data()['max']
       return str(max_lift) + " kg"
 
     # ========================================================================
@@ -72,60 +93,97 @@ def server(input: Inputs, output: Outputs, session: Session) -> None:
     ui.input_select(id="lift_num", label="Choose lift number",
                     choices=["1", "2", "3", "best"],
                     selected="best")
+
+    #add line break
+    ui.br()
+
+    #select year (or all years)
+    ui.input_select(id="year", label="Choose year",
+                    choices=["all"] + [str(year) for year in years],
+                    selected="all")
                 
+    #lift of the selectors (None while a selector is empty or unknown, e.g., as the UI updates)
+    @reactive.calc
+    def selected_lift():
+      return resolve_lift(input.lift_type(), input.lift_num())
+
+    #lift the outputs render: settled once the selectors hold for input_debounce s and only when it
+      #changes (see _00_power_inputs), so lift_type then lift_num in quick succession renders once
+    lift_settled = settle(selected_lift, delay=input_debounce)
+
     @reactive.calc
     def exact_lift():
-      shiny.req(input.lift_num())
-      shiny.req(input.lift_type())
-  
-      #handle case where input.lift_num() might be None or empty
-      lift_num = input.lift_num()
-      lift_type = input.lift_type()
-  
-      if not lift_num or not lift_type: #if either is empty/None, return empty string or error msg
-        return "Invalid input"
-  
-      if lift_num != "best":
-        str_lift = lift_type + lift_num
-      elif lift_num == "best":
-        str_lift = "best3_" + lift_type
-  
-      # if input.lift_num()!="best":
-      #   str_lift = lift_type +
-      #   str_lift = input.lift_type() + input.lift_num()
-      # elif input.lift_num()=="best":
-      #   str_lift = "best3_" + input.lift_type()
-      return str_lift
+      return lift_settled()
+
+    #year (None = all years); kept apart from exact_lift so a year change leaves it untouched
+    @reactive.calc
+    def exact_year():
+      shiny.req(input.year())
+      return None if input.year()=="all" else int(input.year())
+
+    #summary stats of the lift x year subset (shared by the value boxes; the figures look up their own
+      #subset where they are built); a dict lookup, no masking
+    @reactive.calc
+    def lift_data():
+      return summarize_lift(df_lift_years[(exact_lift(), exact_year())])
+
+    #input values recorded with the timings of each render
+    def render_inputs():
+      return {'lift': exact_lift(), 'year': exact_year()}
+
+    #figures of the outputs, built off the event loop (thread or process pool; see _00_power_offload)
+      #so a slow figure does not hold up other sessions; each output shows its figure once it is ready
+    figure_tasks = {output: reactive.extended_task(functools.partial(render_figure, output,
+                                                                     df_lift_years))
+                    for output in dash_outputs}
+
+    #figure of an output's task, with the timings of its build (filter, figure, trendline) added to the
+      #render that shows it
+    def task_figure(output):
+      fig, timings = figure_tasks[output].result()
+      add_timings(timings)
+      return fig
+
+    #build the figures of the selected lift and year, cancelling any still building for an earlier one
+    @reactive.effect
+    def start_figures():
+      lift, year = exact_lift(), exact_year()
+      for task in figure_tasks.values():
+        task.cancel()
+        task.invoke(lift, year)
+
+    #session counts for the render metrics
+    render_stats.session_started()
+    session.on_ended(render_stats.session_ended)
 
 
     # ========================================================================
 
     @render_widget
+    @instrument_output(inputs=render_inputs, widget=as_widget)
     def power_hist():
-      plotly_hist_lift = make_hist_shiny(df, var='mass_kg', lift=exact_lift(), col='darkorange')
-      return plotly_hist_lift
+      return task_figure('power_hist')
 
     # ========================================================================
 
     @render_widget
+    @instrument_output(inputs=render_inputs, widget=as_widget)
     def power_scatter_wilks():
-      plotly_scatter_lift_wilks = make_scatter_shiny(df=df, liftx=exact_lift(), vary='wilks', pt_col="darkred", line_col="purple")
-      return plotly_scatter_lift_wilks
+      return task_figure('power_scatter_wilks')
 
     # ========================================================================
 
     @render_widget
+    @instrument_output(inputs=render_inputs, widget=as_widget)
     def power_box_equip():
-      plotly_box_lift_equipment = make_boxplot_shiny(df=df, varx='equipment', lifty=exact_lift(),
-                                                     col='darkgreen')
-      return plotly_box_lift_equipment
+      return task_figure('power_box_equip')
 
     # ========================================================================
 
     @render_widget
+    @instrument_output(inputs=render_inputs, widget=as_widget)
     def power_scatter_age():
-      plotly_scatter_age_lift = make_scatter_shiny(df=df, varx='age', lifty=exact_lift())
-      return plotly_scatter_age_lift
+      return task_figure('power_scatter_age')
 
     # ========================================================================
 
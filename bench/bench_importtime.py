@@ -0,0 +1,116 @@
+#This script benchmarks the cold start of the dashboard: it runs the imports of the app's setup chunk
+  #in fresh interpreters with python -X importtime and reports the import time per top-level module
+#e.g., python bench/bench_importtime.py --runs 5 --out bench/results/importtime.json
+
+# Load Packages=====================================================================================
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+
+# Objects===========================================================================================
+## Repo root (so the benchmark runs from anywhere)
+root = Path(__file__).resolve().parents[1]
+
+## Imports of the setup chunk of _02_power_dash.qmd (app.py)
+setup_imports = '''
+import functools
+import os
+import sys
+sys.path.append('./code')
+import shiny
+from shiny import reactive
+from shiny.express import render, ui
+from shinywidgets import output_widget, render_widget, as_widget
+from _00_power_fns import index_lifts, index_lift_years, summarize_lift
+from _00_power_fns import load_figures
+from _00_power_data import load_dash_data, path_dash_data, read_config
+from _00_power_dash import path_figs, dash_outputs
+from _00_power_offload import render_figure
+from _00_power_inputs import resolve_lift, settle
+from _00_power_metrics import instrument_output, add_timings, render_stats, start_metrics
+'''
+
+## Modules the dashboard should never load (EDA only)
+mods_eda = ['seaborn', 'matplotlib', 'scipy', 'statsmodels', 'inflection']
+
+
+
+# Benchmark Functions===============================================================================
+## Parse -X importtime output into {module: (self us, cumulative us, depth)}
+def parse_importtime(text):
+  mods = {}
+  for line in text.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_us, cum_us, name = line.removeprefix('import time:').split('|')
+    depth = (len(name) - len(name.lstrip())) // 2
+    mods[name.strip()] = (int(self_us), int(cum_us), depth)
+  return mods
+
+
+## Run the setup imports once in a fresh interpreter
+def run_once(code=setup_imports):
+  start = time.perf_counter()
+  proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=root,
+                        capture_output=True, text=True, check=True)
+  wall_s = time.perf_counter() - start
+  return wall_s, parse_importtime(proc.stderr)
+
+
+## Median import times over several runs
+def bench_importtime(runs=5, top=15):
+  results = [run_once() for _ in range(runs)]
+  mods = results[-1][1]
+
+  #top-level modules (depth 0) by median cumulative time
+  tops = [name for name, (_, _, depth) in mods.items() if depth==0]
+  cum_ms = {name: statistics.median(res[1][name][1] for res in results if name in res[1]) / 1000
+            for name in tops}
+  cum_ms = dict(sorted(cum_ms.items(), key=lambda item: item[1], reverse=True)[:top])
+
+  return {'python': platform.python_version(),
+          'runs': runs,
+          'wall_s': statistics.median(res[0] for res in results),
+          'imports_ms': statistics.median(sum(cum for _, cum, depth in res[1].values() if depth==0)
+                                          for res in results) / 1000,
+          'n_modules': len(mods),
+          'top_ms': cum_ms,
+          'eda_loaded': [mod for mod in mods_eda if mod in mods]}
+
+
+## Print report
+def print_report(report):
+  print(f"python {report['python']}, median of {report['runs']} run(s)")
+  print(f"process wall time: {report['wall_s']*1000:,.0f} ms")
+  print(f"imports: {report['imports_ms']:,.0f} ms across {report['n_modules']} modules")
+  for name, ms in report['top_ms'].items():
+    print(f"  {name:<30}{ms:>10,.1f} ms")
+  print(f"EDA-only modules loaded: {', '.join(report['eda_loaded']) or 'none'}")
+
+
+
+# Command Line======================================================================================
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Benchmark import time of the dashboard setup')
+  parser.add_argument('--runs', type=int, default=5)
+  parser.add_argument('--top', type=int, default=15, help='number of top-level modules to list')
+  parser.add_argument('--out', help='write the report as JSON')
+  args = parser.parse_args(argv)
+
+  report = bench_importtime(runs=args.runs, top=args.top)
+  print_report(report)
+
+  if args.out:
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,250 @@
+#This script load-tests one dashboard process: it drives n simulated sessions of app.py at once
+  #(shiny's mock connection in place of a websocket, so no browser or outside services), each
+  #randomly changing lift_type or lift_num and waiting for the outputs to flush, and reports
+  #throughput, latency percentiles (input change to every output sent), memory per session, and
+  #failed updates (an output sent an error; exits with 1 if any)
+#needs the rendered dashboard (quarto render _02_power_dash.qmd writes the HTML app.py serves) and
+  #its dataset (--data or POWER_DASH_DATA)
+#e.g., python bench/bench_load.py --sessions 1 5 10 25 50 --updates 20 --out bench/results/load.json
+  #(--cold clears the figure caches before each session count, so renders are not served from them)
+
+# Load Packages=====================================================================================
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import psutil
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root / 'code'))
+
+
+
+# Objects===========================================================================================
+## Outputs of the dashboard (all visible, so all render)
+outputs_text = ['min_text_output', 'max_text_output']
+
+
+
+# Session Functions=================================================================================
+## Load the app (after the dataset is set, as app.py loads it on import)
+def load_app(path=None):
+  if path is not None:
+    os.environ['POWER_DASH_DATA'] = str(Path(path).resolve())
+  sys.path.insert(0, str(root))
+  import app
+  return app.app
+
+
+## Mock connection that keeps count of what it sends and signals when the session goes idle with
+  #every pending output sent, as a value or an error (figures built by extended tasks arrive after a
+  #first idle); errors are kept by output
+def make_connection():
+  from shiny._connection import MockConnection
+
+  class LoadConnection(MockConnection):
+    def __init__(self):
+      super().__init__()
+      self.idle = asyncio.Event()
+      self.busy = False
+      self.pending = set()
+      self.errors = {}
+      self.bytes_sent = 0
+
+    #a flush sends idle before the values it flushes
+    async def send(self, message):
+      self.bytes_sent += len(message)
+      if '"busy"' in message:
+        self.busy = json.loads(message).get('busy')=='busy'
+      elif '"values"' in message:
+        message = json.loads(message)
+        self.pending -= {output for output, value in message['values'].items()
+                         if value is not None}
+        for output, error in message.get('errors', {}).items():
+          self.errors.setdefault(output, []).append(error.get('message'))
+          self.pending.discard(output)
+      else:
+        return
+      if not self.busy and not self.pending:
+        self.idle.set()
+
+  return LoadConnection()
+
+
+## Send a message to a session and wait until it is idle with the outputs sent; returns (seconds,
+  #bytes sent, outputs that errored); raises TimeoutError after timeout s
+async def send_wait(conn, method, data, outputs=(), timeout=60):
+  conn.idle.clear()
+  conn.pending = set(outputs)
+  errors_before = {output: len(errors) for output, errors in conn.errors.items()}
+  bytes_before = conn.bytes_sent
+  start = time.perf_counter()
+  conn.cause_receive(json.dumps({'method': method, 'data': data}))
+  try:
+    await asyncio.wait_for(conn.idle.wait(), timeout)
+  except asyncio.TimeoutError:
+    raise TimeoutError(f"no idle with {sorted(conn.pending)} sent within {timeout} s of {data}")
+  errored = [output for output, errors in conn.errors.items()
+             if len(errors) > errors_before.get(output, 0)]
+  return time.perf_counter() - start, conn.bytes_sent - bytes_before, errored
+
+
+## Simulated viewer: opens the dashboard, then makes random lift changes
+class LoadSession:
+  def __init__(self, app, outputs, seed=0, timeout=60):
+    self.app = app
+    self.outputs = outputs
+    self.timeout = timeout
+    self.rng = random.Random(seed)
+    self.inputs = {'lift_type': 'bench', 'lift_num': 'best', 'year': 'all'}
+
+  async def open(self):
+    self.conn = make_connection()
+    self.session = self.app._create_session(self.conn)
+    self.task = asyncio.create_task(self.session._run())
+    hidden = {f".clientdata_output_{output}_hidden": False for output in self.outputs}
+    return await send_wait(self.conn, 'init', {**self.inputs, **hidden}, self.outputs,
+                           timeout=self.timeout)
+
+  #change lift_type or lift_num to another of its values
+  def random_change(self):
+    from _00_power_dash import lift_types, lift_nums
+    key, choices = self.rng.choice([('lift_type', lift_types), ('lift_num', lift_nums)])
+    value = self.rng.choice([choice for choice in choices if choice!=self.inputs[key]])
+    self.inputs[key] = value
+    return {key: value}
+
+  async def run(self, updates, think=0):
+    results = []
+    for _ in range(updates):
+      if think > 0:
+        await asyncio.sleep(self.rng.expovariate(1 / think))
+      results.append(await send_wait(self.conn, 'update', self.random_change(), self.outputs,
+                                     timeout=self.timeout))
+    return results
+
+  async def close(self):
+    self.conn.cause_disconnect()
+    await self.task
+
+
+
+# Load Test Functions===============================================================================
+## Run n concurrent sessions; returns throughput, latency percentiles, memory per session, and
+  #failed updates (an output sent an error)
+async def run_load(app, outputs, n, updates=20, think=0, seed=0, timeout=60):
+  from _00_power_metrics import render_stats
+  render_stats.clear()
+  proc = psutil.Process()
+
+  #memory held per session once open: allocations still traced after opening (tracing slows the
+    #opening, so its latency is only indicative)
+  gc.collect()
+  uss_before = proc.memory_full_info().uss
+  tracemalloc.start()
+  sessions = [LoadSession(app, outputs, seed=seed + i, timeout=timeout) for i in range(n)]
+  opened = await asyncio.gather(*[session.open() for session in sessions])
+  gc.collect()
+  mb_open = tracemalloc.get_traced_memory()[0] / 1e6
+  tracemalloc.stop()
+  uss_open = proc.memory_full_info().uss
+
+  start = time.perf_counter()
+  results = await asyncio.gather(*[session.run(updates, think=think) for session in sessions])
+  wall_s = time.perf_counter() - start
+  uss_after = proc.memory_full_info().uss
+
+  for session in sessions:
+    await session.close()
+
+  updated = [upd for res in results for upd in res]
+  latency_ms = np.array([secs for secs, _, _ in updated]) * 1000
+  errored = [output for _, _, outputs_err in opened + updated for output in outputs_err]
+  renders = render_stats.summary()['outputs']
+  return {'sessions': n, 'updates': int(latency_ms.size), 'wall_s': wall_s,
+          'updates_per_s': latency_ms.size / wall_s,
+          'failed': sum(len(outputs_err) > 0 for _, _, outputs_err in opened + updated),
+          'errors_by_output': {output: errored.count(output) for output in sorted(set(errored))},
+          'open_ms_p50': float(np.percentile([secs for secs, _, _ in opened], 50) * 1000),
+          **{f"latency_ms_p{q}": float(np.percentile(latency_ms, q)) for q in [50, 90, 95, 99]},
+          'latency_ms_max': float(latency_ms.max()),
+          'kb_per_update': float(np.mean([nbytes for _, nbytes, _ in updated]) / 1e3),
+          'mb_per_session': mb_open / n,
+          'mb_process_open': (uss_open - uss_before) / 1e6,
+          'mb_process_run': (uss_after - uss_open) / 1e6,
+          'render_ms_p95': {output: out['total']['p95_ms'] for output, out in renders.items()}}
+
+
+## Run each session count in turn (in one event loop: shiny's reactive lock is bound to the loop it
+  #is first contended in)
+async def bench_load(app, counts, updates=20, think=0, cold=False, seed=0, timeout=60):
+  from _00_power_fns import fig_cache, trend_cache
+  from _00_power_dash import dash_outputs
+  outputs = outputs_text + list(dash_outputs)
+
+  results = []
+  for n in counts:
+    if cold:
+      fig_cache.clear()
+      trend_cache.clear()
+    res = await run_load(app, outputs, n, updates=updates, think=think, seed=seed,
+                         timeout=timeout)
+    res['fig_cache'] = fig_cache.info()
+    results.append(res)
+    print(f"{n:>4} session(s): {res['updates_per_s']:7.1f} updates/s; latency p50 "
+          f"{res['latency_ms_p50']:7.1f}, p95 {res['latency_ms_p95']:7.1f}, p99 "
+          f"{res['latency_ms_p99']:7.1f} ms; {res['mb_per_session']:5.2f} MB/session; "
+          f"{res['kb_per_update']:,.0f} KB/update; {res['failed']} failed", flush=True)
+    if res['failed']:
+      print(f"      errors by output: {res['errors_by_output']}", flush=True)
+  return results
+
+
+
+# Command Line======================================================================================
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Load-test one dashboard process')
+  parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 25])
+  parser.add_argument('--updates', type=int, default=20, help='input changes per session')
+  parser.add_argument('--think', type=float, default=0,
+                      help='mean pause (s) between changes of a session (0 = none)')
+  parser.add_argument('--cold', action='store_true', help='clear the figure caches first')
+  parser.add_argument('--max-p95', type=float, default=500,
+                      help='p95 latency (ms) beyond which latency counts as degraded')
+  parser.add_argument('--timeout', type=float, default=60,
+                      help='seconds to wait for the outputs of a change before giving up')
+  parser.add_argument('--data', help='wrangled dataset (default: POWER_DASH_DATA)')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--out', help='write the results as JSON')
+  args = parser.parse_args(argv)
+
+  app = load_app(args.data)
+  results = asyncio.run(bench_load(app, args.sessions, updates=args.updates, think=args.think,
+                                   cold=args.cold, seed=args.seed, timeout=args.timeout))
+
+  ok = [res['sessions'] for res in results
+        if res['latency_ms_p95'] <= args.max_p95 and not res['failed']]
+  max_sessions = max(ok) if ok else None
+  print(f"most sessions with p95 <= {args.max_p95:.0f} ms and no failed updates: {max_sessions}")
+
+  if args.out:
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps({'python': platform.python_version(),
+                                          'updates': args.updates, 'think': args.think,
+                                          'cold': args.cold, 'max_p95': args.max_p95,
+                                          'max_sessions': max_sessions, 'results': results},
+                                         indent=1))
+
+  return 1 if any(res['failed'] for res in results) else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,257 @@
+#This script benchmarks the dashboard's plotting helpers and render cycle as the data grow: on
+  #synthetic OpenIPF-shaped long tables (one row per entry x lift) it times each output's filter
+  #(masking the full DF), figure build (from its indexed view, caches cleared), and JSON
+  #serialization, plus an end-to-end lift_type change (view lookup, summary, all four outputs,
+  #serialization) and a sampled scatterplot (stratified by age, missing for some entries), and
+  #records wall time (median), peak memory (tracemalloc), and payload bytes
+#e.g., python bench/bench_render.py --rows 27000 270000 2700000 --out bench/results/render.json
+  #(--baseline bench/results/render.json compares against an earlier run and exits with 1 if any
+  #stage got slower than --max-slowdown)
+
+# Load Packages=====================================================================================
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root / 'code'))
+
+from _00_power_fns import (index_lifts, index_lift_years, subset_lift, subset_year,
+                           summarize_lift, make_scatter_shiny, fig_cache, trend_cache)
+from _00_power_data import validate_dash_data
+from _00_power_dash import dash_outputs, render_dash_figs, lift_types
+from _00_power_wrangle import lifts_order
+
+
+
+# Objects===========================================================================================
+## Equipment categories (as read by _00_power_ingest) and their shares
+equipment = ['Raw', 'Wraps', 'Single-ply', 'Multi-ply', 'Unlimited', 'Straps']
+equipment_p = [0.7, 0.1, 0.2, 0, 0, 0]
+
+## Mean and sd of best lifts (kg) by lift type
+best_kg = {'bench': (180, 30), 'deadlift': (280, 40), 'squat': (250, 40)}
+
+## Share of entries without an age (OpenIPF leaves it blank for some lifters)
+age_missing_p = 0.05
+
+
+
+# Data Functions====================================================================================
+## Synthetic long data shaped like the dashboard's: rows = entries x 13 lifts before dropping failed
+  #attempts (stored as negative masses, like OpenIPF), then dashboard cols and dtypes
+def make_long_data(rows, seed=0):
+  rng = np.random.default_rng(seed)
+  n = max(rows // len(lifts_order), 1)
+
+  #best lifts by type, attempts at ~90/95/100% of the best (on 2.5 kg plates), ~15% failed
+  mass_kg = {}
+  for lift_type, (mean, sd) in best_kg.items():
+    best = np.round(rng.normal(mean, sd, n).clip(40) / 2.5) * 2.5
+    for i, frac in enumerate([0.9, 0.95, 1]):
+      attempt = np.round(best * frac / 2.5) * 2.5
+      mass_kg[f"{lift_type}{i+1}"] = np.where(rng.random(n) < 0.15, -attempt, attempt)
+    mass_kg['best3_' + lift_type] = best
+  mass_kg['total'] = sum(mass_kg['best3_' + lift_type] for lift_type in best_kg)
+
+  age = np.round(rng.uniform(18, 70, n) * 2) / 2
+  age[rng.random(n) < age_missing_p] = np.nan
+
+  entries = pd.DataFrame({
+    'id': np.arange(n, dtype='int32'),
+    'age': age.astype('float32'),
+    'equipment': pd.Categorical.from_codes(rng.choice(len(equipment), n, p=equipment_p),
+                                           categories=equipment),
+    'wilks': (mass_kg['total'] * rng.normal(0.6, 0.03, n)).astype('float32'),
+    'year': rng.integers(2021, 2025, n).astype('int16')})
+
+  #one block of rows per lift (like melt_openipf)
+  df = entries.take(np.tile(np.arange(n), len(lifts_order))).reset_index(drop=True)
+  df['lift'] = pd.Categorical.from_codes(np.repeat(np.arange(len(lifts_order)), n),
+                                         categories=lifts_order)
+  df['mass_kg'] = np.concatenate([mass_kg[lift] for lift in lifts_order]).astype('float32')
+  df = df[['id', 'lift', 'mass_kg', 'age', 'equipment', 'wilks', 'year']]
+
+  #successful lifts only (as read by the dashboard)
+  return validate_dash_data(df[df['mass_kg'] > 0].reset_index(drop=True)), len(df)
+
+
+
+# Benchmark Functions===============================================================================
+## Clear the figure and trendline caches (so every run builds)
+def clear_caches():
+  fig_cache.clear()
+  trend_cache.clear()
+
+
+## Median wall time of fn over runs, then peak traced memory of one more run (traced apart from the
+  #timed runs, as tracing slows allocation); returns (last result, stats)
+def measure(fn, repeat=3, clear=True):
+  times = []
+  for _ in range(repeat):
+    if clear:
+      clear_caches()
+    start = time.perf_counter()
+    result = fn()
+    times.append(time.perf_counter() - start)
+
+  if clear:
+    clear_caches()
+  tracemalloc.start()
+  fn()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  return result, {'wall_s': statistics.median(times), 'peak_mb': peak / 1e6}
+
+
+## JSON payload of a figure (what the browser receives for it)
+def payload_figure(fig):
+  return pio.to_json(fig, validate=False)
+
+
+## Index the data (lift views and lift x year views), as the app does at startup
+def build_index(df):
+  df_lifts = index_lifts(df)
+  return df_lifts, index_lift_years(df_lifts)
+
+
+## Lift type change: view lookup, summary, every output, and their payloads; returns payload bytes
+def change_lift_type(df_lift_years, lift, year=None):
+  df_lift = df_lift_years[(lift, year)]
+  summarize_lift(df_lift)
+  figs = render_dash_figs(df_lift, lift)
+  return sum(len(payload_figure(fig)) for fig in figs.values())
+
+
+## Benchmark one data size; returns flat records (rows, name, stage, wall_s, peak_mb, payload_bytes)
+def bench_size(rows, repeat=3, lift='best3_bench', year=None):
+  df, rows_long = make_long_data(rows)
+  records = []
+
+  def record(name, stage, stats, payload_bytes=None):
+    records.append({'rows': rows_long, 'rows_dash': len(df), 'name': name, 'stage': stage,
+                    **stats, 'payload_bytes': payload_bytes})
+
+  #index (once per process)
+  (df_lifts, df_lift_years), stats = measure(lambda: build_index(df), repeat=repeat)
+  record('index', 'build', stats)
+  df_lift = df_lift_years[(lift, year)]
+
+  #each output: filter (mask the full DF), build (from its view), serialize
+  for name, make_fig in dash_outputs.items():
+    _, stats = measure(lambda: subset_year(subset_lift(df, lift), year), repeat=repeat)
+    record(name, 'filter', stats)
+    fig, stats = measure(lambda: make_fig(df_lift, lift), repeat=repeat)
+    record(name, 'build', stats)
+    payload, stats = measure(lambda: payload_figure(fig), repeat=repeat)
+    record(name, 'serialize', stats, len(payload))
+
+  #sampled scatterplot (a tenth of the points, so sampling always runs; age has missing values)
+  _, stats = measure(lambda: make_scatter_shiny(df_lift, varx='age', lifty=lift, mode='sample',
+                                                max_points=max(len(df_lift) // 10, 1)),
+                     repeat=repeat)
+  record('scatter_sample', 'build', stats)
+
+  #end to end: lift_type changes (lift_num = best) with cold caches, then with warm caches (wall time
+    #per change)
+  lifts = ['best3_' + lift_type for lift_type in lift_types]
+  change_all = lambda: [change_lift_type(df_lift_years, lift, year) for lift in lifts]
+  payloads, stats = measure(change_all, repeat=repeat)
+  record('change_lift_type', 'cold', {**stats, 'wall_s': stats['wall_s'] / len(lifts)},
+         int(np.mean(payloads)))
+
+  change_all()
+  payloads, stats = measure(change_all, repeat=repeat, clear=False)
+  record('change_lift_type', 'warm', {**stats, 'wall_s': stats['wall_s'] / len(lifts)},
+         int(np.mean(payloads)))
+
+  clear_caches()
+  return records
+
+
+## Warm up (the first figures pay for plotly's lazy imports and template setup)
+def warm_up():
+  bench_size(1_300, repeat=1)
+
+
+## Commit the benchmark ran on (None outside a git checkout)
+def git_commit():
+  proc = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root, capture_output=True,
+                        text=True)
+  return proc.stdout.strip() or None
+
+
+## Compare records with a baseline run; returns records slower than max_slowdown (stages of at
+  #least min_ms in both runs, so timer noise is left out)
+def compare_records(records, baseline, max_slowdown=1.5, min_ms=5):
+  wall_old = {(rec['rows'], rec['name'], rec['stage']): rec['wall_s'] for rec in baseline}
+  slower = []
+  for rec in records:
+    old = wall_old.get((rec['rows'], rec['name'], rec['stage']))
+    if old is None or min(old, rec['wall_s']) * 1000 < min_ms:
+      continue
+    if rec['wall_s'] / old > max_slowdown:
+      slower.append({**rec, 'wall_s_baseline': old, 'ratio': rec['wall_s'] / old})
+  return slower
+
+
+## Print report
+def print_report(report):
+  print(f"python {report['python']}, commit {report['commit']}, median of {report['repeat']} "
+        f"run(s)")
+  for rows in dict.fromkeys(rec['rows'] for rec in report['records']):
+    recs = [rec for rec in report['records'] if rec['rows']==rows]
+    print(f"\n{rows:,} rows ({recs[0]['rows_dash']:,} successful lifts)")
+    print(f"  {'output':<22}{'stage':<11}{'wall ms':>10}{'peak MB':>10}{'payload KB':>12}")
+    for rec in recs:
+      payload = '' if rec['payload_bytes'] is None else f"{rec['payload_bytes']/1e3:,.1f}"
+      print(f"  {rec['name']:<22}{rec['stage']:<11}{rec['wall_s']*1000:>10,.2f}"
+            f"{rec['peak_mb']:>10,.2f}{payload:>12}")
+
+
+
+# Command Line======================================================================================
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Benchmark the dashboard plotting helpers')
+  parser.add_argument('--rows', type=int, nargs='+', default=[27_000, 270_000, 2_700_000])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--out', help='write the report as JSON')
+  parser.add_argument('--baseline', help='report (JSON) of an earlier run to compare against')
+  parser.add_argument('--max-slowdown', type=float, default=1.5,
+                      help='max ratio of wall time to the baseline')
+  args = parser.parse_args(argv)
+
+  warm_up()
+  report = {'python': platform.python_version(), 'commit': git_commit(), 'repeat': args.repeat,
+            'records': [rec for rows in args.rows for rec in bench_size(rows, repeat=args.repeat)]}
+  print_report(report)
+
+  if args.out:
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=1))
+
+  if args.baseline:
+    slower = compare_records(report['records'], json.loads(Path(args.baseline).read_text())['records'],
+                             max_slowdown=args.max_slowdown)
+    print(f"\n{len(slower)} stage(s) slower than {args.max_slowdown:.2f}x the baseline")
+    for rec in slower:
+      print(f"  {rec['rows']:,} rows {rec['name']} {rec['stage']}: "
+            f"{rec['wall_s_baseline']*1000:,.2f} -> {rec['wall_s']*1000:,.2f} ms "
+            f"({rec['ratio']:.2f}x)")
+    return 1 if slower else 0
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,142 @@
+#This script checks that memory stays flat as dashboard workers are added: it publishes a synthetic
+  #dashboard dataset into shared memory, starts n worker processes that load it the way the app does
+  #(shared: attach to the published copy; private: each reads its own copy), and reports the private
+  #(USS) and proportional (PSS) memory each worker adds
+#e.g., python bench/bench_workers.py --rows 4000000 --workers 1 2 4 8 --out bench/results/workers.json
+  #(exits with 1 if each added shared worker costs more than --max-frac of the data)
+#a lone worker's mapped pages count as private (nobody else maps them), so flatness is judged by the
+  #total proportional memory added per worker
+
+# Load Packages=====================================================================================
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import psutil
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root / 'code'))
+
+from _00_power_data import read_dash_cache, write_dash_cache, load_dash_data
+from _00_power_dash import dash_lifts
+from _00_power_fns import index_lifts
+from _00_power_serve import dir_shm
+
+
+
+# Data Functions====================================================================================
+## Synthetic dashboard data (same cols and dtypes as the app's)
+def make_dash_data(rows, seed=0):
+  rng = np.random.default_rng(seed)
+  lifts = pd.CategoricalDtype(dash_lifts + ['total'])
+  equipment = pd.CategoricalDtype(['Raw', 'Wraps', 'Single-ply', 'Multi-ply', 'Unlimited',
+                                   'Straps'])
+  return pd.DataFrame({
+    'id': rng.integers(0, rows // 13 + 1, rows, dtype='int32'),
+    'lift': pd.Categorical.from_codes(rng.integers(0, len(lifts.categories), rows), dtype=lifts),
+    'mass_kg': rng.normal(200, 40, rows).astype('float32'),
+    'age': rng.uniform(18, 70, rows).astype('float32'),
+    'equipment': pd.Categorical.from_codes(rng.integers(0, 2, rows), dtype=equipment),
+    'wilks': rng.normal(350, 60, rows).astype('float32'),
+    'year': rng.integers(2021, 2025, rows).astype('int16')})
+
+
+
+# Worker Functions==================================================================================
+## Load the data like a worker, touch every col, and report memory once all workers are loaded
+def run_worker(mode, path, barrier, queue):
+  proc = psutil.Process()
+  before = proc.memory_full_info()
+
+  if mode=='shared':
+    os.environ['POWER_DASH_SHARED'] = str(path)
+    df = load_dash_data()
+  else:
+    df = read_dash_cache(path, memory_map=False)
+  df_lifts = index_lifts(df)
+
+  #touch every page (reductions over the arrays themselves, so no copies)
+  checksum = sum(float(df_lift['mass_kg'].to_numpy().sum(dtype='float64'))
+                 for df_lift in df_lifts.values())
+  for col in ['id', 'age', 'wilks', 'year']:
+    checksum += float(df[col].to_numpy().sum(dtype='float64'))
+
+  barrier.wait()
+  after = proc.memory_full_info()
+  queue.put({'uss_mb': (after.uss - before.uss) / 1e6, 'pss_mb': (after.pss - before.pss) / 1e6,
+             'checksum': checksum})
+  barrier.wait()
+
+
+## Start n workers and collect their memory
+def run_workers(mode, path, n):
+  ctx = mp.get_context('spawn')
+  barrier = ctx.Barrier(n)
+  queue = ctx.Queue()
+  procs = [ctx.Process(target=run_worker, args=(mode, path, barrier, queue)) for _ in range(n)]
+  for proc in procs:
+    proc.start()
+  results = [queue.get() for _ in procs]
+  for proc in procs:
+    proc.join()
+
+  return {'mode': mode, 'workers': n,
+          'uss_mb_per_worker': max(res['uss_mb'] for res in results),
+          'uss_mb_total': sum(res['uss_mb'] for res in results),
+          'pss_mb_total': sum(res['pss_mb'] for res in results)}
+
+
+
+# Command Line======================================================================================
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Check memory per dashboard worker')
+  parser.add_argument('--rows', type=int, default=4_000_000)
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+  parser.add_argument('--max-frac', type=float, default=0.1,
+                      help='max memory per added shared worker (fraction of the data)')
+  parser.add_argument('--out', help='write the results as JSON')
+  args = parser.parse_args(argv)
+
+  path = dir_shm / f"power_dash_bench_{os.getpid()}.arrow"
+  try:
+    write_dash_cache(make_dash_data(args.rows), path)
+    data_mb = path.stat().st_size / 1e6
+    print(f"data: {args.rows:,} rows, {data_mb:.1f} MB in {path.parent}")
+
+    results = []
+    for mode in ['private', 'shared']:
+      for n in args.workers:
+        res = run_workers(mode, path, n)
+        results.append(res)
+        print(f"{mode:<8}{n:>3} worker(s): private {res['uss_mb_per_worker']:7.1f} MB/worker, "
+              f"{res['uss_mb_total']:7.1f} MB total; proportional {res['pss_mb_total']:7.1f} MB total")
+  finally:
+    path.unlink(missing_ok=True)
+
+  #total proportional memory added per worker (first to last worker count)
+  per_worker = {}
+  for mode in ['private', 'shared']:
+    res_mode = [res for res in results if res['mode']==mode]
+    first, last = res_mode[0], res_mode[-1]
+    n_added = max(last['workers'] - first['workers'], 1)
+    per_worker[mode] = (last['pss_mb_total'] - first['pss_mb_total']) / n_added
+    print(f"{mode}: {per_worker[mode]:.1f} MB per added worker")
+
+  flat = per_worker['shared'] <= args.max_frac * data_mb
+  print(f"shared workers flat (<= {args.max_frac:.0%} of data per added worker): {flat}")
+
+  if args.out:
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps({'rows': args.rows, 'data_mb': data_mb, 'flat': flat,
+                                          'mb_per_added_worker': per_worker, 'results': results},
+                                         indent=1))
+
+  return 0 if flat else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main())
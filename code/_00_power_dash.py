@@ -0,0 +1,92 @@
+#This script contains objects and functions for the dashboard: its data load and a build step that
+  #renders every dashboard figure ahead of deploy
+
+# Load Packages=====================================================================================
+import argparse
+import time
+from pathlib import Path
+
+from _00_power_fns import (index_lifts, index_lift_years, make_hist_shiny, make_scatter_shiny,
+                           make_boxplot_shiny, save_figures, load_figures, fig_cache)
+from _00_power_data import read_dash_data, write_dash_cache, path_dash_cache
+
+
+
+# Objects===========================================================================================
+## Lifts offered by the dashboard (lift_type x lift_num)
+lift_types = ['bench', 'deadlift', 'squat']
+lift_nums = ['1', '2', '3', 'best']
+dash_lifts = [lift_type + lift_num if lift_num!='best' else 'best3_' + lift_type
+              for lift_type in lift_types for lift_num in lift_nums]
+
+
+
+# Dashboard Functions===============================================================================
+## Path of the precomputed figures for a dataset (saved next to it)
+def path_figs(path):
+  path = Path(path)
+  return path.with_name(path.name.removesuffix('.parquet') + '_figs.json')
+
+
+## Dashboard outputs: function of (lift view, lift) per output (the outputs of _02_power_dash.qmd
+  #build their figures with these, through _00_power_offload)
+dash_outputs = {
+  'power_hist': lambda df_lift, lift: make_hist_shiny(df_lift, var='mass_kg', lift=lift,
+                                                      col='darkorange', bins='auto'),
+  'power_scatter_wilks': lambda df_lift, lift: make_scatter_shiny(df=df_lift, liftx=lift,
+                                                                  vary='wilks', pt_col="darkred",
+                                                                  line_col="purple"),
+  'power_box_equip': lambda df_lift, lift: make_boxplot_shiny(df=df_lift, varx='equipment',
+                                                              lifty=lift, col='darkgreen',
+                                                              summary=True),
+  'power_scatter_age': lambda df_lift, lift: make_scatter_shiny(df=df_lift, varx='age', lifty=lift)}
+
+
+## Render the dashboard figures of a lift
+def render_dash_figs(df_lift, lift):
+  return {name: make_fig(df_lift, lift) for name, make_fig in dash_outputs.items()}
+
+
+
+# Precompute========================================================================================
+## Render all dashboard figures (every lift x year, incl. all years) and save them next to the data
+#figures already saved for unchanged data are loaded rather than rendered again (e.g., after an
+  #incremental refresh only the dropped years render)
+#figures are saved from the figure cache, so it is grown to hold all of them for the build (the
+  #dashboard's size holds only a few years of them)
+def precompute_figures(path, verbose=True):
+  start = time.perf_counter()
+  df_lifts = index_lifts(read_dash_data(path))
+  df_lift_years = index_lift_years(df_lifts)
+  views = [(lift, df_lift) for (lift, year), df_lift in df_lift_years.items() if lift in dash_lifts]
+
+  maxsize = fig_cache.maxsize
+  fig_cache.maxsize = max(maxsize, len(fig_cache.items) + len(views)*len(dash_outputs))
+  try:
+    n_saved = load_figures(path_figs(path), df_lifts)
+    for lift, df_lift in views:
+      render_dash_figs(df_lift, lift)
+    n_figs = save_figures(path_figs(path), df_lifts)
+  finally:
+    fig_cache.maxsize = maxsize
+
+  if verbose:
+    print(f"Rendered {n_figs - n_saved} figures ({n_saved} unchanged) in "
+          f"{time.perf_counter() - start:.1f} s -> {path_figs(path)}")
+
+  return n_figs
+
+
+#e.g., python code/_00_power_dash.py data/openipf-2024-10-12_filtered_wrangled.parquet
+  #also writes the memory-mapped copy of the dashboard data, so the app never builds it at startup
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Render all dashboard figures ahead of deploy')
+  parser.add_argument('path', help='wrangled dataset (parquet)')
+  args = parser.parse_args(argv)
+
+  write_dash_cache(read_dash_data(args.path), path_dash_cache(args.path))
+  precompute_figures(args.path)
+
+
+if __name__ == '__main__':
+  main()
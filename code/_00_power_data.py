@@ -0,0 +1,190 @@
+#This script contains the data-access layer of the dashboard: it resolves the dataset from config,
+  #loads and validates it once per process, and serves it from a memory-mapped Arrow file so every
+  #worker on a host shares the same (read-only) pages
+
+# Load Packages=====================================================================================
+import functools
+import json
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from _00_power_store import read_power_data, meta_file
+
+
+
+# Objects===========================================================================================
+## Repo root (code/ sits directly under it); relative paths in the config resolve against it
+root = Path(__file__).resolve().parents[1]
+
+## Config: defaults, overridden by power_dash.json in the repo root, then by env vars
+  #(POWER_DASH_DATA, POWER_DASH_MEMORY_MAP, POWER_DASH_SHARED, POWER_DASH_WORKERS,
+  #POWER_DASH_METRICS, POWER_DASH_METRICS_INTERVAL, POWER_DASH_METRICS_PORT,
+  #POWER_DASH_RENDER_POOL, POWER_DASH_RENDER_WORKERS, POWER_DASH_INPUT_DEBOUNCE)
+#shared: Arrow file of the dashboard data published in shared memory (set by _00_power_serve for
+  #its workers); workers: number of server processes; metrics: render metrics reporting ('log',
+  #'prometheus', or None; see _00_power_metrics); render_pool: where figures are built ('thread',
+  #'process', or None for the event loop; see _00_power_offload); input_debounce: seconds the lift
+  #selectors must hold before the outputs render (0 = none; see _00_power_inputs)
+config_default = {'data': 'data/openipf-2024-10-12_filtered_wrangled.parquet',
+                  'memory_map': True,
+                  'shared': None,
+                  'workers': 1,
+                  'metrics': None,
+                  'metrics_interval': 60,
+                  'metrics_port': 9100,
+                  'render_pool': 'thread',
+                  'render_workers': 4,
+                  'input_debounce': 0.25}
+config_file = root / 'power_dash.json'
+
+
+## Cols used by the dashboard and their dtypes (checked on load)
+cols_dash = ['id', 'lift', 'mass_kg', 'age', 'equipment', 'wilks', 'year']
+
+schema_dash = {'id': pd.api.types.is_integer_dtype,
+               'lift': lambda dtype: isinstance(dtype, pd.CategoricalDtype),
+               'mass_kg': pd.api.types.is_float_dtype,
+               'age': pd.api.types.is_float_dtype,
+               'equipment': lambda dtype: isinstance(dtype, pd.CategoricalDtype),
+               'wilks': pd.api.types.is_float_dtype,
+               'year': pd.api.types.is_integer_dtype}
+
+
+
+# Config Functions==================================================================================
+## Read config (defaults < power_dash.json < env vars)
+def read_config():
+  config = dict(config_default)
+  if config_file.exists():
+    config.update(json.loads(config_file.read_text()))
+
+  if 'POWER_DASH_DATA' in os.environ:
+    config['data'] = os.environ['POWER_DASH_DATA']
+  if 'POWER_DASH_MEMORY_MAP' in os.environ:
+    config['memory_map'] = os.environ['POWER_DASH_MEMORY_MAP'].lower() not in ['0', 'false', 'no']
+  if 'POWER_DASH_SHARED' in os.environ:
+    config['shared'] = os.environ['POWER_DASH_SHARED']
+  if 'POWER_DASH_WORKERS' in os.environ:
+    config['workers'] = int(os.environ['POWER_DASH_WORKERS'])
+  if 'POWER_DASH_METRICS' in os.environ:
+    config['metrics'] = os.environ['POWER_DASH_METRICS'].lower() or None
+  if 'POWER_DASH_METRICS_INTERVAL' in os.environ:
+    config['metrics_interval'] = float(os.environ['POWER_DASH_METRICS_INTERVAL'])
+  if 'POWER_DASH_METRICS_PORT' in os.environ:
+    config['metrics_port'] = int(os.environ['POWER_DASH_METRICS_PORT'])
+  if 'POWER_DASH_RENDER_POOL' in os.environ:
+    pool = os.environ['POWER_DASH_RENDER_POOL'].lower()
+    config['render_pool'] = None if pool in ['', 'none'] else pool
+  if 'POWER_DASH_RENDER_WORKERS' in os.environ:
+    config['render_workers'] = int(os.environ['POWER_DASH_RENDER_WORKERS'])
+  if 'POWER_DASH_INPUT_DEBOUNCE' in os.environ:
+    config['input_debounce'] = float(os.environ['POWER_DASH_INPUT_DEBOUNCE'])
+
+  return config
+
+
+## Path of the dashboard dataset (absolute, or relative to the repo root)
+def path_dash_data(config=None):
+  config = config or read_config()
+  path = Path(config['data']).expanduser()
+  return path if path.is_absolute() else root / path
+
+
+## Path of the memory-mappable copy of the dashboard data (saved next to the dataset)
+def path_dash_cache(path):
+  path = Path(path)
+  return path.with_name(path.name.removesuffix('.parquet') + '_dash.arrow')
+
+
+
+# Load Functions====================================================================================
+## Read dashboard data (successful lifts only and only the cols used by the dashboard)
+def read_dash_data(path):
+  return read_power_data(path, columns=cols_dash, filters=[('mass_kg', '>', 0)])
+
+
+## Check dashboard data against its schema
+def validate_dash_data(df, path=''):
+  problems = [f"missing col {col}" for col in schema_dash if col not in df.columns]
+  problems += [f"{col} has dtype {df[col].dtype}" for col, check in schema_dash.items()
+               if col in df.columns and not check(df[col].dtype)]
+  if len(df)==0:
+    problems.append('no rows')
+
+  if problems:
+    raise ValueError(f"Invalid dashboard data {path}: " + '; '.join(problems))
+  return df
+
+
+## Write dashboard data as an uncompressed Arrow (IPC) file sorted by lift and year
+#sorted so index_lifts needs no reordering copy; one record batch and NaNs kept as NaNs (not nulls)
+  #so every col maps without a copy
+#written to a temp file next to path and renamed into place, so processes that have the old file
+  #memory-mapped keep reading it (rewriting it in place would crash them with SIGBUS)
+def write_dash_cache(df, path):
+  df = df.iloc[np.lexsort((df['year'].to_numpy(), df['lift'].cat.codes.to_numpy()))]
+
+  arrays = {}
+  for col in df.columns:
+    if isinstance(df[col].dtype, pd.CategoricalDtype):
+      codes = df[col].cat.codes.to_numpy()
+      arrays[col] = pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0),
+                                                   df[col].cat.categories.tolist())
+    else:
+      arrays[col] = pa.array(df[col].to_numpy(), from_pandas=False)
+
+  fd, path_tmp = tempfile.mkstemp(dir=Path(path).parent, prefix=Path(path).name + '.',
+                                  suffix='.tmp')
+  os.close(fd)
+  os.chmod(path_tmp, 0o644)
+  try:
+    feather.write_feather(pa.table(arrays), path_tmp, compression='uncompressed',
+                          chunksize=max(len(df), 1))
+    os.replace(path_tmp, path)
+  except BaseException:
+    Path(path_tmp).unlink(missing_ok=True)
+    raise
+  return path
+
+
+## Read dashboard data from its Arrow file
+#memory_map: cols are read-only views of the (page-cache backed) file instead of private copies
+def read_dash_cache(path, memory_map=True):
+  source = pa.memory_map(str(path)) if memory_map else pa.OSFile(str(path))
+  table = pa.ipc.open_file(source).read_all()
+  return table.to_pandas(split_blocks=True)
+
+
+## Load the dashboard data once per process (every session shares the returned DF; treat it as
+  #read-only)
+#attached to the shared-memory copy when one is published (multi-worker serving); otherwise
+  #memory-mapped from the Arrow copy, which is (re)built from the dataset when missing or older than
+  #it; falls back to reading the dataset into memory if the copy cannot be written
+@functools.cache
+def load_dash_data(path=None, memory_map=None):
+  config = read_config()
+  if path is None and config['shared']:
+    return validate_dash_data(read_dash_cache(config['shared']), config['shared'])
+
+  path = Path(path) if path is not None else path_dash_data(config)
+  memory_map = config['memory_map'] if memory_map is None else memory_map
+
+  if not memory_map:
+    return validate_dash_data(read_dash_data(path), path)
+
+  path_cache = path_dash_cache(path)
+  stale = (not path_cache.exists() or
+           path_cache.stat().st_mtime < (path / meta_file).stat().st_mtime)
+  if stale:
+    df = validate_dash_data(read_dash_data(path), path)
+    try:
+      write_dash_cache(df, path_cache)
+    except OSError:
+      return df
+
+  return validate_dash_data(read_dash_cache(path_cache), path_cache)
@@ -1,202 +1,675 @@
 #This script contains functions to help with plotting for the dashboard
 
 # Load Packages=====================================================================================
+import functools
+import inspect
+import itertools
+import json
+import threading
+import weakref
+from pathlib import Path
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
 
+from _00_power_metrics import phase, register_cache
 
 
-# EDA Functions=====================================================================================
-## Make barplot
-def make_barplot_ncomps(df, var, year=pd.NA, sort=False, tilt=False):
-  #filter by year (if applicable)
-  if pd.notna(year):
-    df = df[df['year']==year]
-  
-  #build DF of counts
-  s_n = df.groupby(var)['id'].nunique()
-  
-  #sort values in descending order by n
-  if sort:
-    s_n.sort_values(ascending=False, inplace=True)
-  
-  #make barplot
-  sns.barplot(x=s_n.index, y=s_n, order=s_n.index)
-  
-  #tilt x tickmarks
-  if tilt:
-    plt.xticks(rotation=90)
-    
-  #add labels
-  plt.xlabel(var, fontsize=14)
-  plt.ylabel("Number of competitions", fontsize=14)
-  plt.show()
-  plt.close()
-  
 
-## Make histogram
-def make_hist(df, var, year=pd.NA, lift=pd.NA, col='darkblue'):
-  #filter by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
-    
-  #convert to DF of unique records of variable
-  if var=='mass_kg':
-    df1 = df[df['lift']==lift]
-  else:
-    df1 = df[['id', var]].drop_duplicates()
-  
-  #plot histogram
-  sns.histplot(x=var, color=col, data=df1)
-  plt.xlabel(var, fontsize=14)
-  plt.ylabel('Count', fontsize=14)
-  plt.show()
-  plt.close()
+# Objects===========================================================================================
+## Ids of lift indexes (part of figure cache keys so figures from different DFs never collide)
+index_ids = itertools.count()
 
+## Views of the lift indexes by (index id, lift, year) (weak, so they go with their index)
+#pandas carries attrs over to DFs derived from a view (e.g., df_lift[df_lift['equipment']=='Raw']),
+  #so the caches check for the view object itself rather than trusting its attrs
+index_views = weakref.WeakValueDictionary()
 
-## Make scatterplot
-def make_scatter(df, year=pd.NA, varx='mass_kg', vary='mass_kg', liftx=pd.NA, lifty=pd.NA, 
-                 pt_col='darkblue', line_col='green'):
-  #filter DF by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
-  
-  #scenario 1: both vars are 'mass_kg'
-  if varx=='mass_kg' and vary=='mass_kg':
-    df1 = df[df['lift'].isin([liftx, lifty])]
-    df2 = df1[['id', 'lift', 'mass_kg']].pivot(index='id', columns='lift', values='mass_kg')
-    
-    sns.lmplot(x=liftx, y=lifty, ci=95, data=df2,
-             scatter_kws={'color': pt_col,
-                          'alpha': 0.2},
-             line_kws={'color': line_col})
-    plt.xlabel(liftx, fontsize=14)
-    plt.ylabel(lifty, fontsize=14)
-    plt.show()
-    plt.close()
-  #scenarios 2-4: either 0 or 1 var is 'mass_kg'
+
+
+# Index Functions===================================================================================
+## Build lift-keyed index of zero-copy views
+#sorts once by lift (then year) so each lift is a contiguous block (row slices of a DF are views);
+  #each view is tagged with its lift so the helpers below skip the lift mask when handed one
+def index_lifts(df):
+  lifts = df['lift'].cat.categories
+  codes = df['lift'].cat.codes.to_numpy()
+  years = df['year'].to_numpy()
+
+  #already sorted (e.g., the memory-mapped dashboard data): keep df itself rather than a copy
+  diff_codes = np.diff(codes)
+  if ((diff_codes > 0) | ((diff_codes==0) & (np.diff(years) >= 0))).all():
+    df_sorted = df
+    codes_sorted = codes
   else:
-    if varx=='mass_kg':
-      df1 = df[df['lift']==liftx]
-      df2 = df1[['id', varx, vary]]
-      labx = liftx
-      laby = vary
-    elif vary=='mass_kg':
-      df1 = df[df['lift']==lifty]
-      df2 = df1[['id', varx, vary]]
-      labx = varx
-      laby = lifty
+    order = np.lexsort((years, codes))
+    df_sorted = df.iloc[order]
+    codes_sorted = codes[order]
+  bounds = np.searchsorted(codes_sorted, np.arange(len(lifts) + 1))
+
+  index_id = next(index_ids)
+  lift_index = {}
+  for i, lift in enumerate(lifts):
+    df_lift = df_sorted.iloc[bounds[i]:bounds[i+1]]
+    df_lift.attrs = {'lift': lift, 'index': index_id, 'year': None}
+    index_views[(index_id, lift, None)] = df_lift
+    lift_index[lift] = df_lift
+
+  return lift_index
+
+
+## Build (lift, year)-keyed index of zero-copy views from a lift index
+#years are contiguous within each lift view, so each (lift, year) view is a row slice of it;
+  #(lift, None) is the lift view itself (all years). Every lift gets every year (empty if none)
+def index_lift_years(lift_index):
+  years = np.unique(np.concatenate([df_lift['year'].to_numpy()
+                                    for df_lift in lift_index.values()]))
+
+  lift_year_index = {}
+  for lift, df_lift in lift_index.items():
+    lift_year_index[(lift, None)] = df_lift
+    bounds = np.searchsorted(df_lift['year'].to_numpy(), np.append(years, years[-1] + 1))
+    for i, year in enumerate(years.tolist()):
+      df_year = df_lift.iloc[bounds[i]:bounds[i+1]]
+      df_year.attrs = {**df_lift.attrs, 'year': year}
+      index_views[(df_lift.attrs['index'], lift, year)] = df_year
+      lift_year_index[(lift, year)] = df_year
+
+  return lift_year_index
+
+
+## Key (index id, lift, year) of an indexed view; None for any other DF (incl. DFs derived from one)
+def view_key(df):
+  key = (df.attrs.get('index'), df.attrs.get('lift'), df.attrs.get('year'))
+  return key if index_views.get(key) is df else None
+
+
+## Subset DF by lift
+def subset_lift(df, lift):
+  #already a view of this lift
+  if df.attrs.get('lift')==lift:
+    return df
+  with phase('filter'):
+    return df[df['lift']==lift]
+
+
+## Subset DF by year (if populated)
+def subset_year(df, year):
+  #already a view of this year
+  if pd.isna(year) or df.attrs.get('year')==year:
+    return df
+  with phase('filter'):
+    return df[df['year']==year]
+
+
+## Summarize lift results (mass_kg) of a lift subset
+def summarize_lift(df_lift, var='mass_kg', probs=[0.25, 0.5, 0.75]):
+  s = df_lift[var]
+  return {'n': s.count(),
+          'min': s.min(),
+          'max': s.max(),
+          'quantiles': s.quantile(probs).to_dict()}
+
+
+
+# Figure Cache======================================================================================
+## Size-bounded LRU cache (process-wide, so shared by all sessions)
+class LRUCache:
+  def __init__(self, maxsize=256):
+    self.maxsize = maxsize
+    self.items = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.lock = threading.Lock()
+
+  #count_miss: count a miss toward the hit rate (False for a first look to be repeated on a miss)
+  def get(self, key, count_miss=True):
+    with self.lock:
+      val = self.items.get(key)
+      if val is None:
+        self.misses += count_miss
+      else:
+        self.hits += 1
+        self.items.move_to_end(key)
+      return val
+
+  def put(self, key, val):
+    with self.lock:
+      self.items[key] = val
+      self.items.move_to_end(key)
+      while len(self.items) > self.maxsize:
+        self.items.popitem(last=False)
+        self.evictions += 1
+
+  def clear(self):
+    with self.lock:
+      self.items.clear()
+
+  def info(self):
+    return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'size': len(self.items), 'maxsize': self.maxsize}
+
+
+#plotly is not thread-safe (px reads and fills the shared default template while building), so the
+  #helpers hold figure_lock around their plotly calls only (filtering, sampling, fits, and box stats
+  #run in parallel); waiting for it counts toward the figure phase
+figure_lock = threading.RLock()
+
+#figures (room for 4 figures per lift x year of a few years) and trendline fits (hit rates are
+  #reported with the render metrics)
+fig_cache = register_cache('figures', LRUCache(maxsize=512))
+trend_cache = register_cache('trendlines', LRUCache(maxsize=512))
+
+#locks of figures being built, by cache key (sessions missing the same figure at once build it once)
+build_locks = {}
+build_locks_lock = threading.Lock()
+
+
+## Decorator: cache figures built from indexed views
+#key = (plot type, index id, lift, remaining args incl. year); other DFs (plain or derived from a
+  #view) have no stable identity so they bypass the cache. Cached figures are shared, so treat
+  #returned figures as read-only
+def cache_figure(kind):
+  def decorator(make_fig):
+    sig = inspect.signature(make_fig)
+
+    @functools.wraps(make_fig)
+    def wrapper(*args, **kwargs):
+      bound = sig.bind(*args, **kwargs)
+      bound.apply_defaults()
+      view = view_key(bound.arguments.pop('df'))
+
+      #a lift matrix is data of its own (it need not match the view, e.g., failed attempts kept), so
+        #figures plotted from one bypass the cache (and the matrix never pins a key)
+      if bound.arguments.pop('lift_matrix', None) is not None:
+        view = None
+
+      #a year view holds the same rows as its lift view filtered by that year (another year filters
+        #it to no rows, which is not that view's figure)
+      if view is not None and view[2] is not None:
+        if pd.isna(bound.arguments['year']):
+          bound.arguments['year'] = view[2]
+        elif bound.arguments['year']!=view[2]:
+          view = None
+
+      if view is None:
+        with phase('figure'):
+          return make_fig(*args, **kwargs)
+
+      index_id, lift, _ = view
+      key = ((kind, index_id, lift) +
+             tuple((arg, None if val is pd.NA else val) for arg, val in bound.arguments.items()))
+      fig = fig_cache.get(key, count_miss=False)
+      if fig is not None:
+        return fig
+
+      #one build per key: later callers wait for it and then find the figure in the cache (a hit)
+      with build_locks_lock:
+        build_lock = build_locks.setdefault(key, threading.Lock())
+      with build_lock:
+        try:
+          fig = fig_cache.get(key)
+          if fig is None:
+            with phase('figure'):
+              fig = make_fig(*args, **kwargs)
+            fig_cache.put(key, fig)
+        finally:
+          with build_locks_lock:
+            build_locks.pop(key, None)
+      return fig
+
+    return wrapper
+  return decorator
+
+
+## Fingerprint the data behind each view of a lift index (ties saved figures to the data they were
+  #rendered from); {'lift|year': fingerprint} for every lift x year and 'lift|None' for all years
+#sum of row hashes, so row order does not matter
+def fingerprint_views(lift_index):
+  fingerprints = {}
+  for lift, df_lift in lift_index.items():
+    hashes = pd.util.hash_pandas_object(df_lift, index=False)
+    fingerprints[f"{lift}|None"] = str(hashes.sum())
+    for year, fp in hashes.groupby(df_lift['year'].to_numpy()).sum().items():
+      fingerprints[f"{lift}|{year}"] = str(fp)
+  return fingerprints
+
+
+## View (lift x year) a cached figure was rendered from
+def view_figure(lift, args):
+  return f"{lift}|{dict(args).get('year')}"
+
+
+## Save cached figures of a lift index to JSON
+def save_figures(path, lift_index):
+  index_id = next(iter(lift_index.values())).attrs['index']
+
+  with fig_cache.lock:
+    entries = [{'kind': key[0], 'lift': key[2], 'args': list(key[3:]),
+                'fig': json.loads(pio.to_json(fig))}
+               for key, fig in fig_cache.items.items() if key[1]==index_id]
+
+  fingerprints = fingerprint_views(lift_index)
+  views = {view_figure(entry['lift'], entry['args']) for entry in entries}
+  Path(path).write_text(json.dumps({'fingerprints': {view: fingerprints.get(view) for view in views},
+                                    'figs': entries}))
+  return len(entries)
+
+
+## Read saved figures (files saved with one fingerprint for the whole index match no view)
+def read_figures(path):
+  saved = json.loads(Path(path).read_text())
+  return {'fingerprints': saved.get('fingerprints', {}), 'figs': saved['figs']}
+
+
+## Load saved figures into the cache for a lift index
+#only figures whose view still holds the data they were rendered from are loaded (others render
+  #live); returns number of figures loaded
+def load_figures(path, lift_index):
+  if not Path(path).exists():
+    return 0
+
+  saved = read_figures(path)
+  index_id = next(iter(lift_index.values())).attrs['index']
+  fingerprints = fingerprint_views(lift_index)
+
+  n_loaded = 0
+  for entry in saved['figs']:
+    args = tuple((arg, tuple(val) if isinstance(val, list) else val) for arg, val in entry['args'])
+    view = view_figure(entry['lift'], args)
+    if saved['fingerprints'].get(view)!=fingerprints.get(view):
+      continue
+    key = (entry['kind'], index_id, entry['lift']) + args
+    fig_cache.put(key, go.Figure(entry['fig']))
+    n_loaded += 1
+
+  if n_loaded < len(saved['figs']):
+    print(f"{len(saved['figs']) - n_loaded} figure(s) in {path} were rendered from different data "
+          f"and will be rendered live")
+  return n_loaded
+
+
+## Drop saved figures of some years (and all-years figures, which include them) from a JSON file;
+  #returns number of figures dropped
+def drop_figures(path, years):
+  if not Path(path).exists():
+    return 0
+
+  saved = read_figures(path)
+  years = {None} | set(years)
+  figs = [entry for entry in saved['figs'] if dict(entry['args']).get('year') not in years]
+  views = {view_figure(entry['lift'], entry['args']) for entry in figs}
+
+  Path(path).write_text(json.dumps({'fingerprints': {view: fp for view, fp
+                                                     in saved['fingerprints'].items()
+                                                     if view in views},
+                                    'figs': figs}))
+  return len(saved['figs']) - len(figs)
+
+
+
+# Trendline Functions===============================================================================
+## Ordinary least squares (closed form); returns (intercept, slope)
+def fit_ols(x, y):
+  x_mean = x.mean()
+  y_mean = y.mean()
+  slope = ((x - x_mean) * (y - y_mean)).sum() / ((x - x_mean)**2).sum()
+  return y_mean - slope*x_mean, slope
+
+
+## LOWESS (locally weighted linear fit with tricube weights) evaluated on a grid of x values
+#vectorized over grid points in chunks so memory stays ~max_cells floats
+def fit_lowess(x, y, frac=0.3, n_grid=50, max_cells=2_000_000):
+  x_grid = np.linspace(x.min(), x.max(), n_grid)
+  k = max(int(np.ceil(frac*len(x))), 2) - 1
+  y_grid = np.empty(n_grid)
+  step = max(max_cells // len(x), 1)
+
+  for start in range(0, n_grid, step):
+    g = x_grid[start:start+step, None]
+    dist = np.abs(x[None, :] - g)
+    h = np.maximum(np.partition(dist, k, axis=1)[:, k:k+1], 1e-12)
+    w = np.clip(1 - (dist/h)**3, 0, None)**3
+
+    #weighted least squares per grid point
+    sw = w.sum(axis=1)
+    x_w = (w*x).sum(axis=1)/sw
+    y_w = (w*y).sum(axis=1)/sw
+    slope = (w*(x - x_w[:, None])*(y - y_w[:, None])).sum(axis=1) / \
+            np.maximum((w*(x - x_w[:, None])**2).sum(axis=1), 1e-12)
+    y_grid[start:start+step] = y_w + slope*(x_grid[start:start+step] - x_w)
+
+  return x_grid, y_grid
+
+
+## Binned means of y over equal-width bins of x
+def fit_binned(x, y, bins=20):
+  edges = np.histogram_bin_edges(x, bins=bins)
+  i_bin = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, len(edges) - 2)
+  n = np.bincount(i_bin, minlength=len(edges) - 1)
+  y_sum = np.bincount(i_bin, weights=y, minlength=len(edges) - 1)
+  keep = n > 0
+  return ((edges[:-1] + edges[1:])/2)[keep], y_sum[keep]/n[keep]
+
+
+## Compute trendline points; key (if given) caches the result
+def make_trendline(x, y, trend='ols', key=None):
+  if key is not None:
+    line = trend_cache.get(key)
+    if line is not None:
+      return line
+
+  with phase('trendline'):
+    #drop missing values
+    keep = np.isfinite(x) & np.isfinite(y)
+    x = x[keep].astype('float64')
+    y = y[keep].astype('float64')
+
+    #a line needs at least 2 distinct x values (with one, the ols slope is 0/0)
+    if len(x) < 2 or x.min()==x.max():
+      line = (np.array([]), np.array([]))
+    elif trend=='ols':
+      intercept, slope = fit_ols(x, y)
+      x_line = np.array([x.min(), x.max()])
+      line = (x_line, intercept + slope*x_line)
+    elif trend=='lowess':
+      line = fit_lowess(x, y)
+    elif trend=='binned':
+      line = fit_binned(x, y)
     else:
-      df2 = df[['id', varx, vary]].drop_duplicates()
-      labx = varx
-      laby = vary
-      
-    sns.lmplot(x=varx, y=vary, ci=95, data=df2,
-               scatter_kws={'color': pt_col,
-                            'alpha': 0.2},
-               line_kws={'color': line_col})
-    plt.xlabel(labx, fontsize=14)
-    plt.ylabel(laby, fontsize=14)
-    plt.show()
-    plt.close()
-
-
-## Make boxplot
-def make_boxplot(df, varx, vary='mass_kg', lifty=pd.NA, year=pd.NA):
-  #filter DF by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
-  
-  if vary=='mass_kg':
-    df1 = df[df['lift']==lifty]
-    df2 = df1[['id', varx, vary]]
-    laby = lifty + '_kg'
+      raise ValueError(f"Unknown trend: {trend}")
+
+  if key is not None:
+    trend_cache.put(key, line)
+  return line
+
+
+## Add trendline (as its own trace) to a scatterplot of cols x and y of df
+def add_trendline(fig, df, x, y, trend='ols', col='green', key=None):
+  x_line, y_line = make_trendline(df[x].to_numpy(dtype='float64', na_value=np.nan),
+                                  df[y].to_numpy(dtype='float64', na_value=np.nan),
+                                  trend=trend, key=key)
+  with figure_lock:
+    fig.add_trace(go.Scatter(x=x_line, y=y_line, mode='lines', line_color=col, name=trend,
+                             hoverinfo='skip'))
+  return fig
+
+
+
+# Point Functions===================================================================================
+## Stratified (by bins of x) random sample of about max_points rows
+#each bin keeps its share of rows but at least min_per_bin (or all of them), so sparse tails remain
+def sample_points(df, x, max_points=10_000, bins=20, min_per_bin=5, seed=0):
+  if len(df) <= max_points:
+    return df
+
+  df = df.iloc[np.random.default_rng(seed).permutation(len(df))]
+  #missing x is a stratum of its own (-1; pd.cut codes are floats when x has missing values)
+  strata = pd.cut(df[x], bins=bins, labels=False).fillna(-1).to_numpy(dtype='int64')
+  counts = np.bincount(strata + 1)[strata + 1]
+  quota = np.maximum(np.ceil(counts*max_points/len(df)), np.minimum(counts, min_per_bin))
+  rank = df.groupby(strata).cumcount().to_numpy()
+  return df[rank < quota]
+
+
+## Plot points of cols x and y of df
+def make_points(df, x, y, pt_col='darkblue', labels=None, mode='auto', max_points=10_000):
+  if mode=='auto':
+    mode = 'svg' if len(df) <= max_points else 'webgl'
+
+  #counts of 2D bins as a heatmap (payload = bins, not points)
+  if mode=='density':
+    df = df[[x, y]].dropna()
+    counts, edges_x, edges_y = np.histogram2d(df[x], df[y], bins=50)
+    counts[counts==0] = np.nan
+    labels = labels or {}
+    with figure_lock:
+      fig = go.Figure(go.Heatmap(x=(edges_x[:-1] + edges_x[1:])/2,
+                                 y=(edges_y[:-1] + edges_y[1:])/2,
+                                 z=counts.T, colorscale=[[0, 'white'], [1, pt_col]],
+                                 colorbar={'title': 'count'}))
+      fig.update_layout(xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+  if mode=='sample':
+    df = sample_points(df, x, max_points=max_points)
+
+  with figure_lock:
+    return px.scatter(x=x, y=y, data_frame=df,
+                      color_discrete_sequence=[pt_col],
+                      opacity=0.2,
+                      labels=labels,
+                      render_mode='webgl' if mode=='webgl' else 'svg')
+
+
+
+# Box Functions=====================================================================================
+## Box stats of y by category x: quartiles, fences (most extreme values within 1.5 IQR of the box),
+  #and a random sample of at most max_outliers outliers per category
+def box_stats(df, x, y, max_outliers=50, seed=0):
+  df = df[[x, y]].dropna()
+  grouped = df.groupby(x, observed=True)[y]
+
+  stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+  stats.columns = ['q1', 'median', 'q3']
+  iqr = stats['q3'] - stats['q1']
+
+  #flag outliers row-wise then take fences from the remaining values
+  lo = df[x].map(stats['q1'] - 1.5*iqr).astype('float64')
+  hi = df[x].map(stats['q3'] + 1.5*iqr).astype('float64')
+  is_out = (df[y] < lo) | (df[y] > hi)
+  within = df.loc[~is_out].groupby(x, observed=True)[y]
+  stats['lowerfence'] = within.min()
+  stats['upperfence'] = within.max()
+  stats['n'] = grouped.count()
+
+  outliers = (df.loc[is_out].sample(frac=1, random_state=seed)
+                .groupby(x, observed=True).head(max_outliers))
+
+  return stats, outliers
+
+
+## Box plot built from box stats
+def make_box_summary(df, x, y, col=None, max_outliers=50):
+  stats, outliers = box_stats(df, x, y, max_outliers=max_outliers)
+  cats = stats.index.astype(str).tolist()
+
+  with figure_lock:
+    fig = go.Figure(go.Box(x=cats, q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+                           lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+                           marker_color=col, boxpoints=False, name=y))
+    fig.add_trace(go.Scatter(x=outliers[x].astype(str), y=outliers[y], mode='markers',
+                             marker_color=col, name='outliers'))
+  return fig
+
+
+
+# Count Functions===================================================================================
+## Cube of number of competitions (entries) by categorical col x year
+#counts distinct ids per (level, year) like groupby(col)['id'].nunique(): entry attributes repeat once
+  #per lift, so a col constant within each id is counted on one row per id, and a col that varies
+  #within an id (e.g., lift) on one row per (id, level). Each col's codes are offset into one shared
+  #range so every (col, level, year) cell is counted with one bincount.
+  #Returns {col: DF of counts (index = levels in category order, cols = years)}
+def make_ncomps_cube(df, cols=None):
+  if cols is None:
+    cols = df.select_dtypes('category').columns.tolist() + ['year']
+
+  id_codes = pd.factorize(df['id'])[0]
+  first_rows = np.unique(id_codes, return_index=True)[1]
+  years, year_codes = np.unique(df['year'].to_numpy(), return_inverse=True)
+
+  levels = {}
+  offsets = {}
+  cells = []
+  n_levels = 0
+  for col in cols:
+    #codes of col (categories for categoricals, sorted values otherwise; -1 = missing)
+    if isinstance(df[col].dtype, pd.CategoricalDtype):
+      col_codes = df[col].cat.codes.to_numpy().astype('int64')
+      levels[col] = df[col].cat.categories
+    else:
+      col_codes, levels[col] = pd.factorize(df[col], sort=True)
+
+    #rows counted: first row of each id, or of each (id, level) if col varies within an id
+    rows = first_rows
+    if (col_codes!=col_codes[first_rows][id_codes]).any():
+      rows = np.unique(id_codes*(len(levels[col]) + 1) + col_codes + 1, return_index=True)[1]
+
+    rows = rows[col_codes[rows] >= 0]
+    cells.append((col_codes[rows] + n_levels)*len(years) + year_codes[rows])
+    offsets[col] = n_levels
+    n_levels += len(levels[col])
+
+  counts = np.bincount(np.concatenate(cells), minlength=n_levels*len(years)).reshape(n_levels,
+                                                                                      len(years))
+
+  return {col: pd.DataFrame(counts[offsets[col]:offsets[col] + len(levels[col])],
+                            index=pd.Index(levels[col], name=col),
+                            columns=pd.Index(years, name='year'))
+          for col in cols}
+
+
+## Cubes of DFs (keyed by the DF itself; the weakref guards against a reused id once a DF is gone)
+#DFs modified in place keep their cube, so rebuild with make_ncomps_cube after editing one
+cube_cache = LRUCache(maxsize=16)
+
+def get_ncomps_cube(df, cols=None):
+  key = (id(df), None if cols is None else tuple(cols))
+  cached = cube_cache.get(key)
+  if cached is not None and cached[0]() is df:
+    return cached[1]
+
+  cube = make_ncomps_cube(df, cols)
+  cube_cache.put(key, (weakref.ref(df), cube))
+  return cube
+
+
+## Look up number of competitions by a col (optionally in one year)
+def lookup_ncomps(cube, var, year=pd.NA, sort=False):
+  counts = cube[var]
+  if pd.isna(year):
+    s_n = counts.sum(axis=1)
+  elif year in counts.columns:
+    s_n = counts[year]
   else:
-    df2 = df[['id', varx, vary]].drop_duplicates()
-    laby = vary
-    
-  sns.boxplot(x=varx, y=vary, data=df2)
-  plt.xlabel(varx, fontsize=14)
-  plt.ylabel(laby, fontsize=14)
-  plt.show()
-  plt.close()
-  
-  
-  
+    s_n = pd.Series(0, index=counts.index)
+
+  if sort:
+    s_n = s_n.sort_values(ascending=False)
+  return s_n.rename('n')
+
+
+
 # Shiny versions of functions=======================================================================
 ## Histogram
-def make_hist_shiny(df, var, year=pd.NA, lift=pd.NA, col='darkblue'):
+@cache_figure('hist')
+#bins: None sends every value and lets plotly bin in the browser; a numpy bin rule ('auto', 'fd',
+  #'sturges', ...) or number of bins bins on the server so the payload is one bar per bin
+def make_hist_shiny(df, var, year=pd.NA, lift=pd.NA, col='darkblue', bins=None):
   #filter by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
+  df = subset_year(df, year)
 
   #convert to DF of unique records of variable
   if var=='mass_kg':
-    df1 = df[df['lift']==lift]
+    df1 = subset_lift(df, lift)
     labx = lift + ' (kg)'
   else:
     df1 = df[['id', var]].drop_duplicates()
     labx = var
 
-  #create histogram using plotly express
-  fig = px.histogram(x=var, color_discrete_sequence=[col], data_frame=df1,
-                     labels={var: labx})
-  
-  #add edges to histogram bars
-  fig.update_traces(marker_line_width=1, marker_line_color="black")
-  
-  #customize layout
-  fig.update_layout(
-    autosize=True,  
-    height=None, 
-    width=None,
-    margin={"l": 5, "r": 5, "t": 27, "b": 5}
-  )
+  #server-side bins
+  if bins is not None:
+    counts, edges = np.histogram(df1[var].dropna().to_numpy(), bins=bins)
+
+  with figure_lock:
+    #create histogram from server-side bins
+    if bins is not None:
+      fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:])/2, y=counts, width=np.diff(edges),
+                             marker_color=col))
+      fig.update_layout(xaxis_title=labx, yaxis_title='count', bargap=0)
+    #create histogram using plotly express
+    else:
+      fig = px.histogram(x=var, color_discrete_sequence=[col], data_frame=df1,
+                         labels={var: labx})
+    
+    #add edges to histogram bars
+    fig.update_traces(marker_line_width=1, marker_line_color="black")
+    
+    #customize layout
+    fig.update_layout(
+      autosize=True,  
+      height=None, 
+      width=None,
+      margin={"l": 5, "r": 5, "t": 27, "b": 5}
+    )
 
   return fig
   
   
 ## Scatterplot
 ## Make scatterplot
+#trend: 'ols', 'lowess', 'binned' (means), or None; fits are cached per (lift, year, vars) for indexed
+  #views
+#mode: 'svg', 'webgl', 'density' (server-side 2D bins), 'sample' (stratified), or 'auto' (svg up to
+  #max_points, webgl beyond); the trendline is always fit on all points
+#lift_matrix: see make_scatter (_00_power_eda)
+@cache_figure('scatter')
 def make_scatter_shiny(df, year=pd.NA, varx='mass_kg', vary='mass_kg', liftx=pd.NA, lifty=pd.NA, 
-                       pt_col='darkblue', line_col='green'):
+                       pt_col='darkblue', line_col='green', trend='ols', mode='auto',
+                       max_points=10_000, lift_matrix=None):
+  #year of a year view
+  if pd.isna(year) and df.attrs.get('year') is not None:
+    year = df.attrs['year']
+
+  #key for trendline cache (indexed views only; not for points from a lift matrix)
+  key = None
+  view = view_key(df)
+  if view is not None and lift_matrix is None:
+    key = (view[0], view[1], None if pd.isna(year) else year,
+           varx, vary, liftx, lifty, trend)
+
   #filter DF by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
+  df = subset_year(df, year)
   
   #scenario 1: both vars are 'mass_kg'
   if varx=='mass_kg' and vary=='mass_kg':
-    df1 = df[df['lift'].isin([liftx, lifty])]
-    df2 = df1[['id', 'lift', 'mass_kg']].pivot(index='id', columns='lift', values='mass_kg')
+    if lift_matrix is not None:
+      df2 = lift_matrix.pair(liftx, lifty, year=None if pd.isna(year) else year)
+    else:
+      df1 = df[df['lift'].isin([liftx, lifty])]
+      df2 = df1[['id', 'lift', 'mass_kg']].pivot(index='id', columns='lift', values='mass_kg')
+    labx = liftx + ' (kg)'
+    laby = lifty + ' (kg)'
   
-    fig = px.scatter(x=liftx, y=lifty, data_frame=df2,
-                     color_discrete_sequence=[pt_col],
-                     opacity=0.2,
-                     trendline='ols',
-                     trendline_scope='overall',
-                     trendline_color_override=line_col,
-                     labels={varx: labx, vary: laby})
+    fig = make_points(df2, liftx, lifty, pt_col=pt_col, labels={liftx: labx, lifty: laby},
+                      mode=mode, max_points=max_points)
+    if trend is not None:
+      add_trendline(fig, df2, liftx, lifty, trend=trend, col=line_col, key=key)
     
     #customize layout
-    fig.update_layout(
-      autosize=True,  
-      height=None, 
-      width=None,
-      margin={"l": 5, "r": 5, "t": 27, "b": 5},
-      showlegend=False
-    )
+    with figure_lock:
+      fig.update_layout(
+        autosize=True,  
+        height=None, 
+        width=None,
+        margin={"l": 5, "r": 5, "t": 27, "b": 5},
+        showlegend=False
+      )
     
   #scenarios 2-4: either 0 or 1 var is 'mass_kg'
   else:
     if varx=='mass_kg':
-      df1 = df[df['lift']==liftx]
+      df1 = subset_lift(df, liftx)
       df2 = df1[['id', varx, vary]]
       labx = liftx + ' (kg)'
       laby = vary
     elif vary=='mass_kg':
-      df1 = df[df['lift']==lifty]
+      df1 = subset_lift(df, lifty)
       df2 = df1[['id', varx, vary]]
       if varx == 'age':
         labx = varx + ' (yr)'
@@ -208,63 +681,71 @@ def make_scatter_shiny(df, year=pd.NA, varx='mass_kg', vary='mass_kg', liftx=pd.
       labx = varx
       laby = vary
     
-    fig = px.scatter(x=varx, y=vary, data_frame=df2,
-                     color_discrete_sequence=[pt_col],
-                     opacity=0.2,
-                     trendline='ols',
-                     trendline_scope='overall',
-                     trendline_color_override=line_col,
-                     labels={varx: labx, vary: laby})
+    fig = make_points(df2, varx, vary, pt_col=pt_col, labels={varx: labx, vary: laby},
+                      mode=mode, max_points=max_points)
+    if trend is not None:
+      add_trendline(fig, df2, varx, vary, trend=trend, col=line_col, key=key)
     
     #customize layout
-    fig.update_layout(
-      autosize=True,  
-      height=None, 
-      width=None,
-      margin={"l": 5, "r": 5, "t": 27, "b": 5},
-      showlegend=False
-    )
+    with figure_lock:
+      fig.update_layout(
+        autosize=True,  
+        height=None, 
+        width=None,
+        margin={"l": 5, "r": 5, "t": 27, "b": 5},
+        showlegend=False
+      )
                
   return fig
 
 ## Boxplot
-def make_boxplot_shiny(df, varx, vary='mass_kg', lifty=pd.NA, year=pd.NA, col=pd.NA):
+#summary: compute quartiles/fences on the server and send only those (plus a capped sample of
+  #outliers per category) instead of every point
+@cache_figure('box')
+def make_boxplot_shiny(df, varx, vary='mass_kg', lifty=pd.NA, year=pd.NA, col=pd.NA, summary=False,
+                       max_outliers=50):
   #filter DF by year if populated
-  if pd.notna(year):
-    df = df[df['year']==year]
+  df = subset_year(df, year)
   
   if vary=='mass_kg':
-    df1 = df[df['lift']==lifty]
+    df1 = subset_lift(df, lifty)
     df2 = df1[['id', varx, vary]]
     laby = lifty + ' (kg)'
   else:
     df2 = df[['id', varx, vary]].drop_duplicates()
     laby = vary
   
-  fig=px.box(data_frame=df2, x=varx, y=vary,
-             color_discrete_sequence=[col],
-             labels={varx: varx, vary: laby})
-             
-  #customize layout
-  fig.update_layout(
-    autosize=True,  
-    height=None, 
-    width=None,
-    margin={"l": 5, "r": 5, "t": 27, "b": 5}
-  )
+  if summary:
+    fig = make_box_summary(df2, varx, vary, col=None if pd.isna(col) else col,
+                           max_outliers=max_outliers)
+
+  with figure_lock:
+    if summary:
+      fig.update_layout(xaxis_title=varx, yaxis_title=laby, showlegend=False)
+    else:
+      fig=px.box(data_frame=df2, x=varx, y=vary,
+                 color_discrete_sequence=[col],
+                 labels={varx: varx, vary: laby})
+               
+    #customize layout
+    fig.update_layout(
+      autosize=True,  
+      height=None, 
+      width=None,
+      margin={"l": 5, "r": 5, "t": 27, "b": 5}
+    )
   
   return fig
 
 
 
+# Lazy EDA Functions================================================================================
+## The seaborn versions of the plots live in _00_power_eda, imported on first use so the dashboard
+  #never loads seaborn/matplotlib
+eda_fns = ['make_barplot_ncomps', 'make_hist', 'make_scatter', 'make_boxplot']
 
-
-
-
-
-
-
-
-
-
-
+def __getattr__(name):
+  if name in eda_fns:
+    import _00_power_eda
+    return getattr(_00_power_eda, name)
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
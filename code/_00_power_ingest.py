@@ -0,0 +1,209 @@
+#This script contains functions to stream the full OpenIPF CSV into a filtered DF
+
+# Load Packages=====================================================================================
+import argparse
+import json
+import time
+from pathlib import Path
+import pandas as pd
+
+from _00_power_wrangle import wrangle_openipf, report_memory, report_timings
+from _00_power_store import (write_power_data, write_lift_matrix, path_lift_matrix, split_entries,
+                             write_meet_fingerprints)
+
+
+
+# Objects===========================================================================================
+## Columns to read
+#leaves out cols that are constant for IPF (tested, sanctioned, parent_federation) and the 4th
+  #attempts (all missing)
+cols_read = ['Name', 'Sex', 'Event', 'Equipment', 'Age', 'AgeClass', 'BirthYearClass', 'Division',
+             'BodyweightKg', 'WeightClassKg',
+             'Squat1Kg', 'Squat2Kg', 'Squat3Kg', 'Best3SquatKg',
+             'Bench1Kg', 'Bench2Kg', 'Bench3Kg', 'Best3BenchKg',
+             'Deadlift1Kg', 'Deadlift2Kg', 'Deadlift3Kg', 'Best3DeadliftKg',
+             'TotalKg', 'Place', 'Dots', 'Wilks', 'Glossbrenner', 'Goodlift',
+             'Country', 'State', 'Federation', 'Date', 'MeetCountry', 'MeetState', 'MeetTown',
+             'MeetName']
+
+
+## Explicit (narrow) dtypes
+cols_float = ['Age', 'BodyweightKg',
+              'Squat1Kg', 'Squat2Kg', 'Squat3Kg', 'Best3SquatKg',
+              'Bench1Kg', 'Bench2Kg', 'Bench3Kg', 'Best3BenchKg',
+              'Deadlift1Kg', 'Deadlift2Kg', 'Deadlift3Kg', 'Best3DeadliftKg',
+              'TotalKg', 'Dots', 'Wilks', 'Glossbrenner', 'Goodlift']
+
+dtypes_read = {col: 'float32' for col in cols_float}
+dtypes_read.update({col: 'str' for col in cols_read if col not in cols_float})
+#fixed sets of values (per OpenPowerlifting docs) so chunks concatenate as categories
+dtypes_read['Sex'] = pd.CategoricalDtype(['M', 'F', 'Mx'])
+dtypes_read['Event'] = pd.CategoricalDtype(['SBD', 'BD', 'SD', 'SB', 'S', 'B', 'D'])
+dtypes_read['Equipment'] = pd.CategoricalDtype(['Raw', 'Wraps', 'Single-ply', 'Multi-ply',
+                                                'Unlimited', 'Straps'])
+
+
+## Cols identifying a meet
+cols_meet = ['Federation', 'Date', 'MeetName']
+
+
+## Default filter: men (18+) in 105 Kg weight class in US meets in last 4 years
+filter_default = {'meet_country': 'USA', 'sex': 'M', 'weight_class_kg': '105',
+                  'years': [2021, 2022, 2023, 2024], 'min_age': 18}
+
+
+
+# Ingest Functions==================================================================================
+## Read CSV in chunks
+def read_openipf_chunks(path, chunksize=200_000, usecols=cols_read):
+  reader = pd.read_csv(path, usecols=usecols, dtype={col: dtypes_read[col] for col in usecols},
+                       chunksize=chunksize)
+
+  #add year to each chunk (dates are ISO 'YYYY-MM-DD' so no need to parse them)
+  for chunk in reader:
+    chunk['year'] = chunk['Date'].str.slice(0, 4).astype('int16')
+    yield chunk
+
+
+## Build mask for a chunk from a filter spec
+def mask_chunk(chunk, spec):
+  return ((chunk['MeetCountry']==spec['meet_country']) &
+          (chunk['Sex']==spec['sex']) &
+          (chunk['WeightClassKg']==spec['weight_class_kg']) &
+           chunk['year'].isin(spec['years']) &
+          (chunk['Age']>=spec['min_age']))
+
+
+## Stream CSV once and keep rows passing each filter spec
+#peak memory is ~one chunk plus the rows kept; the index is the row number in the source file
+def ingest_openipf_slices(path, specs, chunksize=200_000, verbose=True):
+  start = time.perf_counter()
+  n_read = 0
+  chunks_kept = {name: [] for name in specs}
+
+  for chunk in read_openipf_chunks(path, chunksize=chunksize):
+    n_read += len(chunk)
+    for name, spec in specs.items():
+      chunks_kept[name].append(chunk[mask_chunk(chunk, spec)])
+
+  dfs = {name: pd.concat(chunks) for name, chunks in chunks_kept.items()}
+
+  #report throughput
+  if verbose:
+    elapsed = time.perf_counter() - start
+    n_kept = sum(len(df) for df in dfs.values())
+    print(f"Read {n_read:,} rows, kept {n_kept:,} across {len(dfs)} slice(s) in {elapsed:.1f} s "
+          f"({n_read/elapsed:,.0f} rows/s)")
+
+  return dfs
+
+
+## Stream CSV and keep rows passing one filter spec
+def ingest_openipf(path, spec=filter_default, chunksize=200_000, verbose=True):
+  return ingest_openipf_slices(path, {'slice': spec}, chunksize=chunksize, verbose=verbose)['slice']
+
+
+## Read a filtered CSV saved from an ingested slice (first col = row number in the source file) with
+  #the ingest dtypes, so its meet fingerprints match those of the same rows in a new snapshot
+def read_openipf_filtered(path):
+  return pd.read_csv(path, index_col=0, dtype=dtypes_read)
+
+
+
+# Meet Functions====================================================================================
+## Meet key ('federation|date|meet name') of each row
+def key_meets(df, cols=cols_meet):
+  return df[cols[0]].astype(str) + '|' + df[cols[1]].astype(str) + '|' + df[cols[2]].astype(str)
+
+
+## Fingerprint each meet of a filtered DF: sum of its row hashes (source cols only, so row order and
+  #row numbers do not matter); {meet key: fingerprint}
+def fingerprint_meets(df):
+  hashes = pd.util.hash_pandas_object(df[cols_read], index=False)
+  sums = hashes.groupby(key_meets(df).to_numpy()).sum()
+  return {key: str(fp) for key, fp in sums.items()}
+
+
+
+# Extract Functions=================================================================================
+## Name a slice from its spec (e.g., 'usa_m_105')
+def name_slice(spec):
+  return '_'.join([spec['meet_country'], spec['sex'], spec['weight_class_kg']]).lower()
+
+
+## Parse 'COUNTRY:SEX:CLASS' into a filter spec
+def parse_slice(text, years=filter_default['years'], min_age=filter_default['min_age']):
+  meet_country, sex, weight_class_kg = text.split(':')
+  return {'meet_country': meet_country, 'sex': sex, 'weight_class_kg': weight_class_kg,
+          'years': list(years), 'min_age': min_age}
+
+
+## Build every slice in one pass over the source CSV and write one wrangled dataset (plus lift
+  #matrix) per slice
+def extract_slices(path, specs, out_dir='data', prefix=None, chunksize=200_000, verbose=True):
+  #accept a list of specs and name them
+  if not isinstance(specs, dict):
+    specs = {name_slice(spec): spec for spec in specs}
+
+  #default prefix is the snapshot name (e.g., 'openipf-2024-10-12-b58b8e08')
+  if prefix is None:
+    prefix = Path(path).stem
+
+  dfs = ingest_openipf_slices(path, specs, chunksize=chunksize, verbose=verbose)
+
+  paths_out = {}
+  for name, df in dfs.items():
+    path_out = Path(out_dir) / f"{prefix}_{name}_filtered_wrangled.parquet"
+    timings = {}
+    stages = {} if verbose else None
+    df_long, lift_matrix = wrangle_openipf(df, timings=timings, stages=stages)
+    write_power_data(df_long, path_out, split=True)
+    write_meet_fingerprints(path_out, fingerprint_meets(df), specs[name])
+    write_lift_matrix(lift_matrix, path_lift_matrix(path_out))
+    paths_out[name] = path_out
+
+    if verbose:
+      print(f"  {name}: {len(df):,} entries -> {path_out}")
+      report_timings(timings)
+      report_memory({'long': stages['melt']},
+                    dict(zip(['entries', 'facts'], split_entries(df_long))))
+      del stages
+
+  return paths_out
+
+
+
+# Command Line======================================================================================
+#e.g., python code/_00_power_ingest.py data/openipf-2024-10-12-b58b8e08.csv \
+  #--slice USA:M:105 --slice USA:M:93 --slice USA:F:84 --years 2021 2022 2023 2024
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Extract wrangled division slices from OpenIPF CSV')
+  parser.add_argument('path', help='OpenIPF CSV')
+  parser.add_argument('--slice', dest='slices', action='append', default=[],
+                      metavar='COUNTRY:SEX:CLASS', help='meet country, sex, and weight class')
+  parser.add_argument('--spec-file', help='JSON file mapping slice names to filter specs')
+  parser.add_argument('--years', nargs='+', type=int, default=filter_default['years'])
+  parser.add_argument('--min-age', type=float, default=filter_default['min_age'])
+  parser.add_argument('--out-dir', default='data')
+  parser.add_argument('--prefix', help='output file prefix (default: CSV name)')
+  parser.add_argument('--chunksize', type=int, default=200_000)
+  args = parser.parse_args(argv)
+
+  #combine specs from both sources
+  specs = {}
+  if args.spec_file:
+    with open(args.spec_file) as f:
+      specs.update(json.load(f))
+  for text in args.slices:
+    spec = parse_slice(text, years=args.years, min_age=args.min_age)
+    specs[name_slice(spec)] = spec
+
+  if not specs:
+    parser.error('provide at least one --slice or a --spec-file')
+
+  extract_slices(args.path, specs, out_dir=args.out_dir, prefix=args.prefix,
+                 chunksize=args.chunksize)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,56 @@
+#This script contains the input handling of the dashboard: the lift selectors are resolved to a lift,
+  #and the lift is settled (debounced and deduplicated) before the outputs read it, so a burst of
+  #selector changes (e.g., lift_type then lift_num) renders the outputs once, a lift equal to the
+  #current one renders nothing, and transient selections (empty or unknown values while the UI
+  #updates) never reach the plotting helpers
+
+# Load Packages=====================================================================================
+import time
+from shiny import reactive, req
+
+from _00_power_dash import lift_types, lift_nums
+
+
+
+# Input Functions===================================================================================
+## Lift of a lift type and number (None for a transient or unknown selection)
+def resolve_lift(lift_type, lift_num):
+  if lift_type not in lift_types or lift_num not in lift_nums:
+    return None
+  return 'best3_' + lift_type if lift_num=='best' else lift_type + lift_num
+
+
+## Settle a reactive function: its value settles once it has held for delay s (debounce), only if it
+  #differs from the settled value (dedupe), and never as None; the first value settles at once (so
+  #the first render does not wait); returns a function reading the settled value (silent until one
+  #has settled)
+#call in a session (the settled value and its timer are per session)
+def settle(fn, delay=0.25):
+  settled = reactive.value(None)
+  candidate = {'value': None, 'since': None}
+
+  @reactive.effect
+  def watch():
+    value = fn()
+    now = time.monotonic()
+    if candidate['since'] is None or value!=candidate['value']:
+      candidate.update(value=value, since=now)
+
+    with reactive.isolate():
+      current = settled.get()
+    if value is None or value==current:
+      return
+
+    #re-check once the value has held for delay (a change meanwhile restarts the wait)
+    wait = candidate['since'] + delay - now
+    if current is not None and wait > 0:
+      reactive.invalidate_later(wait)
+      return
+    settled.set(value)
+
+  def get():
+    value = settled.get()
+    req(value is not None)
+    return value
+
+  return get
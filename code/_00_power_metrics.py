@@ -0,0 +1,320 @@
+#This script contains the render instrumentation of the dashboard: each instrumented output records
+  #its time by phase (filter, figure, trendline, widget) with the input values it rendered, and the
+  #renders are summarized (p50/p95 per output and phase, cache hit rates, session counts) in a
+  #periodic log summary or on a Prometheus endpoint
+#phases nest: a phase's time excludes the phases inside it (e.g., figure excludes trendline), and
+  #time outside any phase counts as other
+#work done for a render elsewhere (e.g., a figure built on a pool; see _00_power_offload) is timed
+  #apart (time_offloaded) and added to the render that uses its result (add_timings)
+
+# Load Packages=====================================================================================
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+from _00_power_data import read_config
+
+
+
+# Objects===========================================================================================
+## Logger (render summaries; per-render records at debug level)
+logger = logging.getLogger('power_dash')
+
+## Render being timed in the current context (None outside instrumented outputs)
+current_render = contextvars.ContextVar('current_render', default=None)
+
+## Caches reported with the renders (registered by the modules that own them)
+caches = {}
+
+
+
+# Render Stats======================================================================================
+## Recent renders per output and session counts (process-wide, so shared by all sessions)
+class RenderStats:
+  def __init__(self, maxlen=1000):
+    self.maxlen = maxlen
+    self.renders = {}
+    self.counts = {}
+    self.sessions_active = 0
+    self.sessions_total = 0
+    self.cache_lookups = {}
+    self.lock = threading.Lock()
+
+  def add(self, record):
+    with self.lock:
+      self.renders.setdefault(record['output'], deque(maxlen=self.maxlen)).append(record)
+      self.counts[record['output']] = self.counts.get(record['output'], 0) + 1
+
+  #lookups of caches in other processes (e.g., pool processes), reported with this process's
+  def add_cache_lookups(self, lookups):
+    with self.lock:
+      for name, counts in lookups.items():
+        totals = self.cache_lookups.setdefault(name, {'hits': 0, 'misses': 0})
+        totals['hits'] += counts['hits']
+        totals['misses'] += counts['misses']
+
+  def session_started(self):
+    with self.lock:
+      self.sessions_active += 1
+      self.sessions_total += 1
+
+  def session_ended(self):
+    with self.lock:
+      self.sessions_active -= 1
+
+  def clear(self):
+    with self.lock:
+      self.renders.clear()
+      self.counts.clear()
+
+  #p50/p95 (ms) of recent renders per output, overall and by phase (a phase missing from a render
+    #counts as 0)
+  def summary(self):
+    with self.lock:
+      renders = {output: list(records) for output, records in self.renders.items()}
+      counts = dict(self.counts)
+      cache_lookups = {name: dict(totals) for name, totals in self.cache_lookups.items()}
+      sessions = {'active': self.sessions_active, 'total': self.sessions_total}
+
+    outputs = {}
+    for output, records in renders.items():
+      phases = sorted({phase for record in records for phase in record['phases']})
+      times = {'total': [record['total_s'] for record in records],
+               **{phase: [record['phases'].get(phase, 0) for record in records] for phase in phases}}
+      outputs[output] = {'n': len(records), 'count': counts[output],
+                         **{phase: {'p50_ms': np.percentile(secs, 50) * 1000,
+                                    'p95_ms': np.percentile(secs, 95) * 1000}
+                            for phase, secs in times.items()}}
+
+    return {'outputs': outputs, 'sessions': sessions,
+            'caches': {name: summarize_cache(cache, cache_lookups.get(name))
+                       for name, cache in caches.items()}}
+
+
+render_stats = RenderStats()
+
+
+## Register a cache (anything with info() -> hits, misses, ...) to report with the renders
+def register_cache(name, cache):
+  caches[name] = cache
+  return cache
+
+
+## Cache info plus its hit rate; lookups: hits and misses in other processes to add (size and
+  #evictions stay this process's)
+def summarize_cache(cache, lookups=None):
+  info = cache.info()
+  if lookups is not None:
+    info = {**info, 'hits': info['hits'] + lookups['hits'],
+            'misses': info['misses'] + lookups['misses']}
+  lookups = info['hits'] + info['misses']
+  return {**info, 'hit_rate': info['hits'] / lookups if lookups else None}
+
+
+
+# Instrumentation Functions=========================================================================
+## Time a phase of the current render (no-op outside instrumented outputs)
+@contextmanager
+def phase(name):
+  render = current_render.get()
+  if render is None:
+    yield
+    return
+
+  #the stack holds the time of phases nested in each open phase (subtracted from it)
+  start = time.perf_counter()
+  render['stack'].append(0.0)
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - start
+    nested = render['stack'].pop()
+    render['phases'][name] = render['phases'].get(name, 0) + elapsed - nested
+    render['stack'][-1] += elapsed
+
+
+## Decorator: time renders of an output by phase
+#inputs: function returning the input values of the render (e.g., the reactive calcs it reads);
+  #widget: function converting the result to its widget (e.g., shinywidgets.as_widget), timed as the
+  #widget phase (render_widget passes widgets through, so the conversion is not repeated)
+def instrument_output(inputs=None, widget=None, stats=render_stats):
+  def decorator(render_fn):
+    @functools.wraps(render_fn)
+    def wrapper(*args, **kwargs):
+      render = {'phases': {}, 'stack': [0.0], 'offloaded_s': 0.0}
+      token = current_render.set(render)
+      start = time.perf_counter()
+      try:
+        result = render_fn(*args, **kwargs)
+        if widget is not None and result is not None:
+          with phase('widget'):
+            result = widget(result)
+      finally:
+        current_render.reset(token)
+      total = time.perf_counter() - start + render['offloaded_s']
+
+      phases = render['phases']
+      phases['other'] = max(total - sum(phases.values()), 0)
+      record = {'output': render_fn.__name__, 'time': time.time(), 'total_s': total,
+                'phases': phases, 'inputs': inputs() if inputs is not None else {}}
+      stats.add(record)
+
+      if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"{record['output']} {total*1000:.1f} ms (" +
+                     ', '.join(f"{name} {secs*1000:.1f}" for name, secs in phases.items()) +
+                     f") {record['inputs']}")
+      return result
+
+    return wrapper
+  return decorator
+
+
+
+## Time fn(*args) by phase apart from any render (e.g., a figure built on a pool thread or process,
+  #which does not share the render's context); returns (result, timings), timings = phases, total
+  #seconds, and, if count_caches, the lookups of the registered caches meanwhile (only meaningful
+  #where nothing else uses them, e.g., in a pool process)
+def time_offloaded(fn, *args, count_caches=False):
+  infos = {name: cache.info() for name, cache in caches.items()} if count_caches else {}
+  render = {'phases': {}, 'stack': [0.0]}
+  token = current_render.set(render)
+  start = time.perf_counter()
+  try:
+    result = fn(*args)
+  finally:
+    current_render.reset(token)
+
+  timings = {'phases': render['phases'], 'total_s': time.perf_counter() - start, 'caches': {}}
+  for name, info in infos.items():
+    info_after = caches[name].info()
+    timings['caches'][name] = {key: info_after[key] - info[key] for key in ['hits', 'misses']}
+  return result, timings
+
+
+## Add the timings of work done elsewhere (see time_offloaded) to the current render: its phases
+  #and its total (no-op outside instrumented outputs)
+def add_timings(timings):
+  render = current_render.get()
+  if render is None:
+    return
+  for name, secs in timings['phases'].items():
+    render['phases'][name] = render['phases'].get(name, 0) + secs
+  render['offloaded_s'] += timings['total_s']
+
+
+
+# Reporting Functions===============================================================================
+## Log a summary of the renders
+def log_summary(stats=render_stats, level=logging.INFO):
+  summary = stats.summary()
+  for output, out in summary['outputs'].items():
+    phases = ', '.join(f"{name} {times['p50_ms']:.1f}/{times['p95_ms']:.1f}"
+                       for name, times in out.items()
+                       if name not in ['n', 'count', 'total'])
+    logger.log(level, f"{output}: {out['count']} renders, p50/p95 {out['total']['p50_ms']:.1f}/"
+                      f"{out['total']['p95_ms']:.1f} ms ({phases})")
+
+  for name, cache in summary['caches'].items():
+    hit_rate = 'n/a' if cache['hit_rate'] is None else f"{cache['hit_rate']:.0%}"
+    logger.log(level, f"{name} cache: {hit_rate} hits ({cache['size']}/{cache['maxsize']} entries, "
+                      f"{cache['evictions']} evictions)")
+  logger.log(level, f"sessions: {summary['sessions']['active']} active, "
+                    f"{summary['sessions']['total']} total")
+  return summary
+
+
+## Log a summary every interval (s) from a daemon thread; returns an event that stops it
+def start_log_summary(interval=60, stats=render_stats):
+  stop = threading.Event()
+
+  def run():
+    while not stop.wait(interval):
+      log_summary(stats)
+
+  threading.Thread(target=run, name='power_dash_metrics', daemon=True).start()
+  return stop
+
+
+## Serve the summary on a Prometheus endpoint (prometheus_client is optional); each worker process
+  #takes the first free port of port, port+1, ..., port+tries-1; returns the port (None if no
+  #endpoint was started)
+def start_prometheus(port=9100, tries=1, stats=render_stats):
+  try:
+    import prometheus_client
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+  except ImportError:
+    logger.warning('prometheus_client is not installed; no metrics endpoint')
+    return None
+
+  class RenderCollector:
+    def collect(self):
+      summary = stats.summary()
+
+      seconds = GaugeMetricFamily('power_dash_render_seconds',
+                                  'Render time of recent renders by output and phase',
+                                  labels=['output', 'phase', 'quantile'])
+      renders = CounterMetricFamily('power_dash_renders', 'Renders by output', labels=['output'])
+      for output, out in summary['outputs'].items():
+        renders.add_metric([output], out['count'])
+        for name, times in out.items():
+          if name in ['n', 'count']:
+            continue
+          seconds.add_metric([output, name, '0.5'], times['p50_ms'] / 1000)
+          seconds.add_metric([output, name, '0.95'], times['p95_ms'] / 1000)
+
+      lookups = CounterMetricFamily('power_dash_cache_lookups', 'Cache lookups by cache and result',
+                                    labels=['cache', 'result'])
+      hit_rate = GaugeMetricFamily('power_dash_cache_hit_rate', 'Cache hit rate', labels=['cache'])
+      for name, cache in summary['caches'].items():
+        lookups.add_metric([name, 'hit'], cache['hits'])
+        lookups.add_metric([name, 'miss'], cache['misses'])
+        if cache['hit_rate'] is not None:
+          hit_rate.add_metric([name], cache['hit_rate'])
+
+      sessions_active = GaugeMetricFamily('power_dash_sessions_active', 'Open sessions')
+      sessions_active.add_metric([], summary['sessions']['active'])
+      sessions = CounterMetricFamily('power_dash_sessions', 'Sessions started')
+      sessions.add_metric([], summary['sessions']['total'])
+
+      yield from [seconds, renders, lookups, hit_rate, sessions_active, sessions]
+
+  registry = prometheus_client.CollectorRegistry()
+  registry.register(RenderCollector())
+  for port_try in range(port, port + tries):
+    try:
+      prometheus_client.start_http_server(port_try, registry=registry)
+      return port_try
+    except OSError:
+      continue
+
+  logger.warning(f"no free port for the metrics endpoint in {port}-{port + tries - 1}")
+  return None
+
+
+## Start the reporting set in config (once per process): metrics = 'log' (summary every
+  #metrics_interval s), 'prometheus' (endpoint on metrics_port; each worker takes the next free
+  #port; falls back to the log summary without one), or None (renders are still recorded)
+@functools.cache
+def start_metrics():
+  config = read_config()
+  if config['metrics'] is None:
+    return None
+
+  if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+  if config['metrics']=='prometheus':
+    port = start_prometheus(config['metrics_port'], tries=config['workers'])
+    if port is not None:
+      logger.info(f"render metrics on http://localhost:{port}/metrics")
+      return port
+  start_log_summary(config['metrics_interval'])
+  return 'log'
@@ -0,0 +1,77 @@
+#This script contains the offloaded rendering of the dashboard figures: figures are built on a thread
+  #or process pool (config render_pool) instead of the event loop, so a slow figure (e.g., a large
+  #scatterplot with its trendline) does not hold up the other sessions of the process
+#threads share the process's data, index, and figure cache; processes (spawned) attach to the
+  #dashboard data themselves (memory-mapped or shared) and keep their own index and figure cache, and
+  #get only (output, lift, year) and return the figure
+#plotly is not thread-safe, so the plotly calls of figure builds run one at a time per process
+  #(figure_lock of _00_power_fns); threads still filter, sample, and fit in parallel, and processes
+  #also build the figures themselves in parallel
+#each build is timed by phase (filter, figure, trendline) and returns its timings with the figure,
+  #to be added to the render that shows it (_00_power_metrics.add_timings)
+
+# Load Packages=====================================================================================
+import asyncio
+import functools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from _00_power_data import read_config, load_dash_data, path_dash_data
+from _00_power_fns import index_lifts, index_lift_years, load_figures
+from _00_power_dash import dash_outputs, path_figs
+from _00_power_metrics import phase, render_stats, time_offloaded
+
+
+
+# Build Functions===================================================================================
+## Build the figure of an output for a lift x year view of an index
+def build_figure(output, lift_year_index, lift, year):
+  with phase('filter'):
+    df_lift = lift_year_index[(lift, year)]
+  return dash_outputs[output](df_lift, lift)
+
+
+## Lift x year index of the process's dashboard data (once per process; pool processes only)
+@functools.cache
+def dash_views():
+  df_lifts = index_lifts(load_dash_data())
+  load_figures(path_figs(path_dash_data()), df_lifts)
+  return index_lift_years(df_lifts)
+
+
+## Build the figure of an output in a pool process; returns (figure, timings incl. cache lookups)
+def build_figure_process(output, lift, year):
+  return time_offloaded(build_figure, output, dash_views(), lift, year, count_caches=True)
+
+
+
+# Pool Functions====================================================================================
+## Render pool from config (once per process): 'thread', 'process', or None (build on the event loop)
+@functools.cache
+def render_pool():
+  config = read_config()
+  if config['render_pool']=='thread':
+    return ThreadPoolExecutor(max_workers=config['render_workers'],
+                              thread_name_prefix='power_dash_render')
+  if config['render_pool']=='process':
+    return ProcessPoolExecutor(max_workers=config['render_workers'],
+                               mp_context=mp.get_context('spawn'), initializer=dash_views)
+  return None
+
+
+## Build the figure of an output on the render pool (awaitable, e.g., by a reactive.extended_task);
+  #returns (figure, timings)
+#cancelling the await cancels the build if it has not started (a started build runs to the end but
+  #its figure is dropped); cache lookups in pool processes are added to this process's render stats
+async def render_figure(output, lift_year_index, lift, year):
+  pool = render_pool()
+  if pool is None:
+    return time_offloaded(build_figure, output, lift_year_index, lift, year)
+
+  if isinstance(pool, ProcessPoolExecutor):
+    future = pool.submit(build_figure_process, output, lift, year)
+  else:
+    future = pool.submit(time_offloaded, build_figure, output, lift_year_index, lift, year)
+  fig, timings = await asyncio.wrap_future(future)
+  render_stats.add_cache_lookups(timings['caches'])
+  return fig, timings
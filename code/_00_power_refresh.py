@@ -0,0 +1,184 @@
+#This script contains functions to refresh wrangled datasets from a new OpenIPF snapshot
+  #incrementally: meets are fingerprinted, and only new/changed/removed meets are wrangled and merged,
+  #rewriting only the year partitions they touch and dropping only the saved figures of those years
+
+# Load Packages=====================================================================================
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from _00_power_ingest import ingest_openipf_slices, fingerprint_meets, key_meets
+from _00_power_wrangle import wrangle_openipf, order_lifts, order_places
+from _00_power_store import (read_meta, read_entries, read_power_data, update_power_data,
+                             split_entries, cols_fact, read_meet_fingerprints,
+                             write_meet_fingerprints, path_lift_matrix, read_lift_matrix,
+                             write_lift_matrix, LiftMatrix, meets_file)
+from _00_power_fns import drop_figures
+from _00_power_dash import path_figs
+
+
+
+# Objects===========================================================================================
+## Meet key cols of the wrangled (snake case) data
+cols_meet_wrangled = ['federation', 'date', 'meet_name']
+
+
+
+# Delta Functions===================================================================================
+## Meet fingerprints and filter spec of a dataset ({'spec': ..., 'meets': ...})
+#written by _00_power_ingest, _00_power_wrangle, and _01_power_data-clean_eda; datasets written
+  #before them have none and must be rebuilt once
+def read_dataset_fingerprints(path):
+  fps = read_meet_fingerprints(path)
+  if fps is None:
+    raise ValueError(f"{path} has no meet fingerprints ({meets_file}), so it cannot be refreshed; "
+                     f"rebuild it once with python code/_00_power_ingest.py <snapshot CSV> --slice "
+                     f"COUNTRY:SEX:CLASS (or code/_00_power_wrangle.py <filtered CSV> {path})")
+  return fps
+
+
+## Compare meet fingerprints of two snapshots: keys of new, changed, and removed meets
+def diff_meets(fps_old, fps_new):
+  return {'new': sorted(set(fps_new) - set(fps_old)),
+          'changed': sorted(key for key in set(fps_new) & set(fps_old)
+                            if fps_new[key]!=fps_old[key]),
+          'removed': sorted(set(fps_old) - set(fps_new))}
+
+
+## Union of category orders: current order first, then new categories (place/lift keep their rules)
+def merge_categories(col, cats_old, cats_new):
+  cats = list(cats_old) + [cat for cat in cats_new if cat not in set(cats_old)]
+  if col=='place':
+    return order_places(cats)
+  if col=='lift':
+    return order_lifts(cats)
+  return cats
+
+
+## Concat two DFs of the same cols, unioning category orders
+def concat_categorical(df_old, df_new, categories):
+  df_old = df_old.copy()
+  df_new = df_new.copy()
+  for col in df_old.select_dtypes('category').columns:
+    df_old[col] = df_old[col].cat.set_categories(categories[col])
+    df_new[col] = pd.Categorical(df_new[col].astype(object), categories=categories[col])
+  return pd.concat([df_old, df_new], ignore_index=True)
+
+
+
+# Refresh Functions=================================================================================
+## Refresh one dataset with the filtered rows of its slice from the new snapshot
+#df_slice: slice of the new snapshot (raw cols; index = row number); returns a summary dict
+def refresh_dataset(path, df_slice):
+  path = Path(path)
+  fps_new = fingerprint_meets(df_slice)
+  fps_old = read_dataset_fingerprints(path)['meets']
+  delta = diff_meets(fps_old, fps_new)
+  keys_affected = set(delta['new']) | set(delta['changed']) | set(delta['removed'])
+
+  summary = {'path': str(path), **{kind: len(keys) for kind, keys in delta.items()},
+             'years': [], 'entries_dropped': 0, 'entries_added': 0, 'figs_dropped': 0}
+  if not keys_affected:
+    return summary
+
+  ## Stored entries of affected meets (to drop) and new rows of new/changed meets (to add)
+  meta = read_meta(path)
+  entries = read_entries(path)
+  keys_entries = key_meets(entries.assign(date=entries['date'].dt.strftime('%Y-%m-%d')),
+                           cols=cols_meet_wrangled)
+  drop = keys_entries.isin(keys_affected).to_numpy()
+  ids_drop = entries.loc[drop, 'id'].to_numpy()
+
+  keys_slice = key_meets(df_slice)
+  df_add = df_slice[keys_slice.isin(set(delta['new']) | set(delta['changed'])).to_numpy()]
+
+  #ids of added rows follow the stored ids (row numbers of the new snapshot would collide)
+  df_add = df_add.set_axis(pd.RangeIndex(entries['id'].max() + 1,
+                                         entries['id'].max() + 1 + len(df_add)))
+
+  ## Wrangle only the delta
+  df_add_long, matrix_add = wrangle_openipf(df_add)
+  entries_add, facts_add = split_entries(df_add_long)
+
+  categories = {col: merge_categories(col, meta['categories'][col],
+                                      df_add_long[col].cat.categories if col in df_add_long
+                                      else [])
+                for col in meta['categories']}
+
+  ## Years touched: of dropped entries and of added entries
+  years = sorted(set(entries.loc[drop, 'date'].dt.year.tolist()) |
+                 set(entries_add['date'].dt.year.tolist()))
+
+  #facts of those years: stored rows minus dropped ids, plus added rows
+  facts_years = read_power_data(path, columns=cols_fact, years=years)
+  facts_years = facts_years[~facts_years['id'].isin(ids_drop)]
+  facts_years = concat_categorical(facts_years, facts_add[cols_fact].astype(
+    {col: facts_years[col].dtype for col in cols_fact if col!='lift'}), categories)
+
+  entries_kept = entries[~drop]
+  cols_entry = entries.columns.tolist()
+  entries_new = concat_categorical(entries_kept, entries_add[cols_entry].astype(
+    {col: entries[col].dtype for col in cols_entry if col not in meta['categories']}), categories)
+
+  update_power_data(path, entries_new, facts_years, years, categories=categories)
+  write_meet_fingerprints(path, fps_new, read_dataset_fingerprints(path)['spec'])
+
+  ## Lift matrix: drop rows of dropped ids and append the delta
+  path_matrix = path_lift_matrix(path)
+  if path_matrix.exists():
+    matrix = read_lift_matrix(path_matrix, memory_map=False)
+    keep = ~np.isin(matrix.ids, ids_drop)
+    cols_add = [matrix_add.cols[lift] for lift in matrix.lifts]
+    write_lift_matrix(LiftMatrix(ids=np.concatenate([matrix.ids[keep], matrix_add.ids]),
+                                 years=np.concatenate([matrix.years[keep], matrix_add.years]),
+                                 lifts=matrix.lifts,
+                                 mass_kg=np.asfortranarray(np.concatenate(
+                                   [matrix.mass_kg[keep], matrix_add.mass_kg[:, cols_add]]))),
+                      path_matrix)
+
+  ## Saved figures of the years touched (and all-years figures); others stay valid
+  summary.update({'years': years, 'entries_dropped': int(drop.sum()),
+                  'entries_added': len(entries_add),
+                  'figs_dropped': drop_figures(path_figs(path), years)})
+  return summary
+
+
+## Refresh datasets from a new snapshot (one pass over the CSV for all of them)
+#each dataset's slice spec is read from its meet fingerprints (written by _00_power_ingest)
+def refresh_datasets(path_csv, paths, chunksize=200_000, verbose=True):
+  start = time.perf_counter()
+  specs = {str(path): read_dataset_fingerprints(path)['spec'] for path in paths}
+  dfs = ingest_openipf_slices(path_csv, specs, chunksize=chunksize, verbose=verbose)
+
+  summaries = [refresh_dataset(path, dfs[str(path)]) for path in paths]
+
+  if verbose:
+    for summary in summaries:
+      print(f"  {summary['path']}: {summary['new']} new, {summary['changed']} changed, "
+            f"{summary['removed']} removed meet(s); -{summary['entries_dropped']:,} "
+            f"+{summary['entries_added']:,} entries; years {summary['years']} rewritten; "
+            f"{summary['figs_dropped']} saved figure(s) dropped")
+    print(f"Refreshed {len(paths)} dataset(s) in {time.perf_counter() - start:.1f} s")
+
+  return summaries
+
+
+
+# Command Line======================================================================================
+#e.g., python code/_00_power_refresh.py data/openipf-2025-01-05-xxxxxxxx.csv \
+  #data/openipf-2024-10-12-b58b8e08_usa_m_105_filtered_wrangled.parquet
+  #(then python code/_00_power_dash.py <dataset> re-renders only the dropped figures)
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Refresh wrangled datasets from a new OpenIPF CSV')
+  parser.add_argument('path', help='new OpenIPF CSV')
+  parser.add_argument('datasets', nargs='+', help='wrangled datasets (from _00_power_ingest)')
+  parser.add_argument('--chunksize', type=int, default=200_000)
+  args = parser.parse_args(argv)
+
+  refresh_datasets(args.path, args.datasets, chunksize=args.chunksize)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,65 @@
+#This script serves the dashboard with several worker processes that share one copy of its data:
+  #the dashboard data are published once into shared memory as an Arrow file and every worker
+  #memory-maps it (zero-copy, read-only) instead of loading a private copy
+#sessions live in the worker holding their websocket; the dashboard talks to sessions only over the
+  #websocket, so no sticky routing is needed (add it at the proxy if downloads/uploads are added)
+
+# Load Packages=====================================================================================
+import argparse
+import os
+import tempfile
+from pathlib import Path
+import uvicorn
+
+from _00_power_data import root, read_config, load_dash_data, write_dash_cache
+
+
+
+# Objects===========================================================================================
+## Shared-memory dir (tmpfs on Linux; elsewhere the temp dir, whose mapped pages are still shared
+  #through the page cache)
+dir_shm = Path('/dev/shm') if Path('/dev/shm').is_dir() else Path(tempfile.gettempdir())
+
+
+
+# Serve Functions===================================================================================
+## Publish the dashboard data (validated) into shared memory; returns the file workers attach to
+def publish_dash_data(path=None, dir_out=dir_shm):
+  path_shared = Path(dir_out) / f"power_dash_{os.getpid()}.arrow"
+  write_dash_cache(load_dash_data(path), path_shared)
+  return path_shared
+
+
+## Serve app.py with n workers attached to one published copy of the data
+#workers: defaults to config (POWER_DASH_WORKERS or power_dash.json; 1 if neither)
+def serve(workers=None, host='127.0.0.1', port=8000, path=None):
+  workers = workers or read_config()['workers']
+
+  #workers inherit the env: same dataset (for the precomputed figures) and the shared copy
+  if path is not None:
+    os.environ['POWER_DASH_DATA'] = str(Path(path).resolve())
+  path_shared = publish_dash_data(path)
+  os.environ['POWER_DASH_SHARED'] = str(path_shared)
+
+  try:
+    uvicorn.run('app:app', host=host, port=port, workers=workers, app_dir=str(root))
+  finally:
+    path_shared.unlink(missing_ok=True)
+
+
+
+# Command Line======================================================================================
+#e.g., python code/_00_power_serve.py --workers 4 --host 0.0.0.0 --port 8000
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Serve the dashboard with shared-memory workers')
+  parser.add_argument('--workers', type=int, help='worker processes (default: POWER_DASH_WORKERS)')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--data', help='wrangled dataset (default: POWER_DASH_DATA)')
+  args = parser.parse_args(argv)
+
+  serve(workers=args.workers, host=args.host, port=args.port, path=args.data)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,223 @@
+#This script contains functions to write/read the wrangled (long) DF as a partitioned Parquet dataset
+  #and the wide lift matrix
+
+# Load Packages=====================================================================================
+import json
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+
+# Objects===========================================================================================
+## Partition cols (one directory per lift and year)
+partition_cols = ['lift', 'year']
+
+## Sidecar file holding col order, dtypes, and category orders
+#parquet keeps only the categories present in each file (in file order) and partition cols come
+  #back as dictionaries, so declared orders/dtypes are restored from here on read
+meta_file = '_power_meta.json'
+
+## Entry table of a split dataset (leading '_' keeps it out of the partitioned dataset)
+entries_file = '_entries.parquet'
+
+## Cols of the fact table of a split dataset (everything else is per entry, i.e., per id)
+cols_fact = ['id', 'lift', 'mass_kg', 'year']
+
+## Per-meet fingerprints of the source rows of a dataset (for incremental refreshes)
+meets_file = '_meets.json'
+
+
+
+# Store Functions===================================================================================
+## Split long DF into entry table (one row per id) and slim fact table (one row per id and lift)
+def split_entries(df):
+  entries = df.drop(columns=[col for col in cols_fact if col!='id']).drop_duplicates('id')
+  return entries.reset_index(drop=True), df[cols_fact]
+
+
+## Join entry cols onto fact table by id
+def join_entries(facts, entries, cols=None):
+  if cols is None:
+    cols = [col for col in entries.columns if col not in facts.columns]
+  return facts.join(entries.set_index('id')[cols], on='id')
+
+
+## Write DF to partitioned dataset (replaces any existing dataset at path)
+#split: store the per-entry cols once per id in an entry table and only cols_fact per lift
+def write_power_data(df, path, split=False):
+  path = Path(path)
+  if path.exists():
+    shutil.rmtree(path)
+
+  if split:
+    entries, df_part = split_entries(df)
+  else:
+    df_part = df
+
+  table = pa.Table.from_pandas(df_part, preserve_index=False)
+  pq.write_to_dataset(table, path, partition_cols=partition_cols)
+  if split:
+    pq.write_table(pa.Table.from_pandas(entries, preserve_index=False), path / entries_file)
+
+  meta = {'columns': df.columns.tolist(),
+          'dtypes': {col: str(df[col].dtype) for col in df.columns},
+          'categories': {col: df[col].cat.categories.tolist()
+                         for col in df.select_dtypes('category').columns},
+          'split': split}
+  (path / meta_file).write_text(json.dumps(meta, indent=1))
+
+  return path
+
+
+## Read (a subset of) the dataset
+#lifts/years prune partitions, columns prune columns, and filters (pyarrow DNF, e.g.,
+  #[('mass_kg', '>', 0)]) are pushed down to the row groups; for split datasets filters may only
+  #use cols_fact and entry cols are joined on by id
+def read_power_data(path, columns=None, lifts=None, years=None, filters=None, memory_map=True):
+  path = Path(path)
+  meta = read_meta(path)
+  if columns is None:
+    columns = meta['columns']
+
+  filters = list(filters or [])
+  if lifts is not None:
+    filters.append(('lift', 'in', list(lifts)))
+  if years is not None:
+    filters.append(('year', 'in', list(years)))
+
+  if meta.get('split'):
+    cols_entry = [col for col in columns if col not in cols_fact]
+    cols_read = [col for col in cols_fact if col in columns or (col=='id' and cols_entry)]
+  else:
+    cols_read = columns
+
+  table = pq.read_table(path, columns=cols_read, filters=filters or None, memory_map=memory_map,
+                        partitioning='hive')
+  df = table.to_pandas()
+
+  if meta.get('split') and cols_entry:
+    entries = pq.read_table(path / entries_file, columns=['id'] + cols_entry,
+                            memory_map=memory_map).to_pandas()
+    df = join_entries(df, entries, cols_entry)
+
+  #restore col order, dtypes, and category orders
+  cols = [col for col in meta['columns'] if col in columns]
+  return apply_meta(df[cols], meta)
+
+
+## Restore dtypes and category orders of (some) cols of a dataset from its meta
+def apply_meta(df, meta):
+  for col in df.columns:
+    if col in meta['categories']:
+      cats = meta['categories'][col]
+      df[col] = pd.Categorical(df[col].astype(pd.Index(cats).dtype), categories=cats)
+    elif str(df[col].dtype) != meta['dtypes'][col]:
+      df[col] = df[col].astype(meta['dtypes'][col])
+  return df
+
+
+## Read meta of a dataset
+def read_meta(path):
+  return json.loads((Path(path) / meta_file).read_text())
+
+
+## Read the entry table of a split dataset
+def read_entries(path):
+  path = Path(path)
+  return apply_meta(pq.read_table(path / entries_file).to_pandas(), read_meta(path))
+
+
+## Update a split dataset in place: replace its entry table and the partitions of some years (all
+  #lifts); partitions of other years are left as is
+#facts: fact rows (cols_fact) of those years; categories: category orders (defaults to current)
+def update_power_data(path, entries, facts, years, categories=None):
+  path = Path(path)
+  meta = read_meta(path)
+  if categories is not None:
+    meta['categories'].update(categories)
+
+  #drop the partitions of the years, then write their new rows
+  for year in years:
+    for path_year in path.glob(f"lift=*/year={year}"):
+      shutil.rmtree(path_year)
+  if len(facts) > 0:
+    table = pa.Table.from_pandas(apply_meta(facts[cols_fact].copy(), meta), preserve_index=False)
+    pq.write_to_dataset(table, path, partition_cols=partition_cols)
+
+  cols_entry = [col for col in meta['columns'] if col not in cols_fact or col=='id']
+  entries = apply_meta(entries[cols_entry].copy(), meta)
+  pq.write_table(pa.Table.from_pandas(entries, preserve_index=False), path / entries_file)
+
+  #meta last (its mtime marks derived files, e.g., the dashboard copy, as stale)
+  (path / meta_file).write_text(json.dumps(meta, indent=1))
+  return path
+
+
+## Write/read per-meet fingerprints (and the filter spec) of a dataset
+def write_meet_fingerprints(path, fingerprints, spec):
+  (Path(path) / meets_file).write_text(json.dumps({'spec': spec, 'meets': fingerprints}, indent=1))
+
+
+def read_meet_fingerprints(path):
+  path = Path(path) / meets_file
+  return json.loads(path.read_text()) if path.exists() else None
+
+
+
+# Lift Matrix=======================================================================================
+## Wide lift matrix: one row per id, one col per lift (float32, Fortran order so each lift is a
+  #contiguous col); any liftx/lifty pair is a two-col slice, no pivot needed
+class LiftMatrix:
+  def __init__(self, ids, years, lifts, mass_kg):
+    self.ids = ids
+    self.years = years
+    self.lifts = list(lifts)
+    self.mass_kg = mass_kg
+    self.cols = {lift: i for i, lift in enumerate(self.lifts)}
+
+  #DF of two lifts (index = id), optionally for one year
+  def pair(self, liftx, lifty, year=None):
+    ids = self.ids
+    x = self.mass_kg[:, self.cols[liftx]]
+    y = self.mass_kg[:, self.cols[lifty]]
+    if year is not None:
+      keep = self.years==year
+      ids, x, y = ids[keep], x[keep], y[keep]
+
+    return pd.DataFrame({liftx: x, lifty: y}, index=pd.Index(ids, name='id'), copy=False)
+
+
+## Path of the lift matrix for a dataset (saved next to it)
+def path_lift_matrix(path):
+  path = Path(path)
+  return path.with_name(path.name.removesuffix('.parquet') + '_lifts')
+
+
+## Write lift matrix (a directory of .npy files plus the lift names)
+def write_lift_matrix(lift_matrix, path):
+  path = Path(path)
+  path.mkdir(parents=True, exist_ok=True)
+  np.save(path / 'id.npy', lift_matrix.ids)
+  np.save(path / 'year.npy', lift_matrix.years)
+  np.save(path / 'mass_kg.npy', lift_matrix.mass_kg)
+  (path / 'lifts.json').write_text(json.dumps(lift_matrix.lifts))
+  return path
+
+
+## Read lift matrix (memory-mapped by default)
+#successful: set failed (<= 0) attempts to NaN, i.e., the dashboard's mass_kg > 0 filter (copies)
+def read_lift_matrix(path, memory_map=True, successful=False):
+  path = Path(path)
+  mmap_mode = 'r' if memory_map else None
+  mass_kg = np.load(path / 'mass_kg.npy', mmap_mode=mmap_mode)
+  if successful:
+    mass_kg = np.asfortranarray(np.where(mass_kg > 0, mass_kg, np.nan).astype('float32'))
+
+  return LiftMatrix(ids=np.load(path / 'id.npy', mmap_mode=mmap_mode),
+                    years=np.load(path / 'year.npy', mmap_mode=mmap_mode),
+                    lifts=json.loads((path / 'lifts.json').read_text()),
+                    mass_kg=mass_kg)
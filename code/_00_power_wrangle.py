@@ -0,0 +1,222 @@
+#This script contains functions to wrangle filtered OpenIPF data into the long (per lift) DF (no plots
+  #or prints unless asked), and a command line to wrangle a filtered CSV into a stored dataset
+
+# Load Packages=====================================================================================
+import argparse
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import inflection
+
+from _00_power_store import (LiftMatrix, write_power_data, write_lift_matrix, path_lift_matrix,
+                             write_meet_fingerprints)
+
+
+
+# Objects===========================================================================================
+## Cols that are the same for all rows of a slice
+cols_const = ['sex', 'tested', 'sanctioned', 'parent_federation', 'meet_country', 'weight_class_kg']
+
+## Cols with all missing data
+cols_missing = ['bench4_kg', 'deadlift4_kg', 'squat4_kg']
+
+## Lift cols (regex)
+regex_lifts = 'squat|bench|deadlift|^total_kg$'
+
+## Categorical cols
+cols_cat = ['event', 'equipment', 'age_class', 'birth_year_class', 'division', 'lift', 'place',
+            'country', 'state', 'federation', 'meet_state', 'meet_town', 'meet_name']
+
+## Lift order: attempts then best3 for each lift type, then total
+lifts_order = ['bench1', 'bench2', 'bench3', 'best3_bench',
+               'deadlift1', 'deadlift2', 'deadlift3', 'best3_deadlift',
+               'squat1', 'squat2', 'squat3', 'best3_squat',
+               'total']
+
+## Col order of the long DF: lifter and entry, then lift, results, lifter location, and meet
+cols_long = ['id', 'name', 'event', 'equipment', 'age', 'age_class', 'birth_year_class', 'division',
+             'bodyweight_kg', 'lift', 'mass_kg', 'place', 'dots', 'wilks', 'glossbrenner',
+             'goodlift', 'country', 'state', 'federation', 'date', 'year', 'meet_state',
+             'meet_town', 'meet_name']
+
+
+
+# Ordering Functions================================================================================
+## Order lifts by the declared order (any others, e.g., 4th attempts, follow in sorted order)
+def order_lifts(lifts):
+  lifts = set(lifts)
+  return ([lift for lift in lifts_order if lift in lifts] +
+          sorted(lift for lift in lifts if lift not in lifts_order))
+
+
+## Order places: numeric places in order, then DD, DQ, G, etc.
+def order_places(places):
+  return (sorted([cat for cat in places if cat.isdigit()], key=int) +
+          sorted([cat for cat in places if not cat.isdigit()]))
+
+
+## Order cols by the declared order (any others follow in their current order)
+def order_cols(cols):
+  return ([col for col in cols_long if col in cols] +
+          [col for col in cols if col not in cols_long])
+
+
+
+# Wrangling Functions===============================================================================
+## Prep filtered data (index = row number in source file) in wide format
+def prep_openipf(df):
+  #move row number to id col and convert cols to snake case
+  df = df.rename_axis('id').reset_index()
+  df.columns = df.columns.map(inflection.underscore).tolist()
+
+  #drop constant and all-missing cols (if present)
+  return df.drop(columns=cols_const + cols_missing, errors='ignore')
+
+
+## Wide lift matrix: one row per id, one float32 col per lift (missing = NaN)
+def make_lift_matrix(df_wide):
+  cols_lift = df_wide.filter(regex=regex_lifts).columns
+  lifts = order_lifts([col.removesuffix('_kg') for col in cols_lift])
+  mass_kg = np.asfortranarray(df_wide[[lift + '_kg' for lift in lifts]].to_numpy('float32'))
+  return LiftMatrix(ids=df_wide['id'].to_numpy(), years=df_wide['year'].to_numpy('int16'),
+                    lifts=lifts, mass_kg=mass_kg)
+
+
+## Melt prepped (wide) data into long format
+#entry cols are converted once per entry (categories, dates) and then repeated once per lift by
+  #position (categoricals keep their codes); lift is built from codes in lift order, so rows come in
+  #blocks by lift
+def melt_openipf(df):
+  cols_pivot = df.filter(regex=regex_lifts).columns
+  lifts = order_lifts([col.removesuffix('_kg') for col in cols_pivot])
+  cols_id = df.columns[~df.columns.isin(cols_pivot)].to_list()
+
+  ## Convert data types (entry cols)
+  df_id = df[cols_id].astype({col: 'category' for col in cols_cat if col in cols_id})
+
+  #place: numeric places in order, then DD, DQ, G, etc.
+  df_id['place'] = df_id['place'].cat.set_categories(order_places(df_id['place'].cat.categories))
+
+  #date
+  df_id['date'] = pd.to_datetime(df_id['date'])
+
+  ## Pivot from wide to long for lifts
+  n = len(df)
+  df_long = df_id.take(np.tile(np.arange(n), len(lifts))).reset_index(drop=True)
+  df_long['lift'] = pd.Categorical.from_codes(np.repeat(np.arange(len(lifts)), n), categories=lifts)
+  df_long['mass_kg'] = df[[lift + '_kg' for lift in lifts]].to_numpy().ravel(order='F')
+
+  ## Re-order columns
+  return df_long[order_cols(df_long.columns)]
+
+
+## Time a stage of wrangling (seconds) into a dict
+@contextmanager
+def time_stage(timings, stage):
+  start = time.perf_counter()
+  yield
+  timings[stage] = time.perf_counter() - start
+
+
+## Wrangle filtered data (index = row number in source file) into long format (compact dtypes) and
+  #the wide lift matrix; pass a dict as timings to get the seconds per stage, and one as stages to
+  #keep the output of each stage (e.g., stages['melt'] = the long DF before optimize_dtypes, the
+  #before of report_memory)
+def wrangle_openipf(df, timings=None, stages=None):
+  timings = {} if timings is None else timings
+  with time_stage(timings, 'prep'):
+    df_wide = prep_openipf(df)
+  with time_stage(timings, 'lift_matrix'):
+    lift_matrix = make_lift_matrix(df_wide)
+  with time_stage(timings, 'melt'):
+    df_long = melt_openipf(df_wide)
+  with time_stage(timings, 'dtypes'):
+    df_long_opt = optimize_dtypes(df_long)
+
+  if stages is not None:
+    stages.update({'prep': df_wide, 'lift_matrix': lift_matrix, 'melt': df_long,
+                   'dtypes': df_long_opt})
+  return df_long_opt, lift_matrix
+
+
+## Report seconds per stage
+def report_timings(timings):
+  stages = ', '.join(f"{stage} {secs*1000:,.1f} ms" for stage, secs in timings.items())
+  print(f"{stages} (total {sum(timings.values())*1000:,.1f} ms)")
+
+
+
+# Memory Functions==================================================================================
+## Memory (MB) of a DF (deep = count string contents too)
+def memory_mb(df):
+  return df.memory_usage(deep=True).sum() / 1e6
+
+
+## Downcast numeric cols: floats to float32 where values survive at given decimals (lifts, body
+  #weights, and points have at most 2-3 decimals) and ints to the smallest int that fits
+def optimize_dtypes(df, decimals=3):
+  df = df.copy()
+  for col in df.select_dtypes('float').columns:
+    if df[col].dtype=='float32':
+      continue
+    values = df[col].to_numpy()
+    values32 = values.astype('float32')
+    if np.allclose(values32, values, rtol=0, atol=0.5 * 10**-decimals, equal_nan=True):
+      df[col] = values32
+
+  for col in df.select_dtypes('integer').columns:
+    df[col] = pd.to_numeric(df[col], downcast='integer')
+
+  return df
+
+
+## Report memory of DFs before/after an optimization (e.g., {'long': df} vs {'entries': ...})
+def report_memory(before, after):
+  mb_before = sum(memory_mb(df) for df in before.values())
+  mb_after = sum(memory_mb(df) for df in after.values())
+  for label, dfs in [('before', before), ('after', after)]:
+    parts = ', '.join(f"{name} {memory_mb(df):.2f} MB" for name, df in dfs.items())
+    print(f"{label}: {parts}")
+  print(f"total: {mb_before:.2f} MB -> {mb_after:.2f} MB ({mb_before/mb_after:.1f}x smaller)")
+
+  return mb_before, mb_after
+
+
+
+# Command Line======================================================================================
+#e.g., python code/_00_power_wrangle.py data/openipf_2024-10-12_filtered.csv \
+  #data/openipf-2024-10-12_filtered_wrangled.parquet
+#--slice/--years/--min-age give the filter spec the CSV was sliced with (default: the default filter
+  #of _00_power_ingest); it is saved with the meet fingerprints so _00_power_refresh can refresh the
+  #dataset from a new snapshot
+def main(argv=None):
+  #imported here: _00_power_ingest imports this module
+  from _00_power_ingest import (read_openipf_filtered, fingerprint_meets, parse_slice,
+                                filter_default)
+
+  parser = argparse.ArgumentParser(description='Wrangle a filtered OpenIPF CSV into a dataset')
+  parser.add_argument('path', help='filtered CSV (first col = row number in the source file)')
+  parser.add_argument('path_out', help='wrangled dataset (parquet dir)')
+  parser.add_argument('--slice', default='USA:M:105',
+                      help='COUNTRY:SEX:CLASS the CSV was sliced with')
+  parser.add_argument('--years', nargs='+', type=int, default=filter_default['years'])
+  parser.add_argument('--min-age', type=float, default=filter_default['min_age'])
+  args = parser.parse_args(argv)
+
+  timings = {}
+  with time_stage(timings, 'read'):
+    df = read_openipf_filtered(args.path)
+  df_long, lift_matrix = wrangle_openipf(df, timings=timings)
+  with time_stage(timings, 'write'):
+    write_power_data(df_long, args.path_out, split=True)
+    write_meet_fingerprints(args.path_out, fingerprint_meets(df),
+                            parse_slice(args.slice, years=args.years, min_age=args.min_age))
+    write_lift_matrix(lift_matrix, path_lift_matrix(args.path_out))
+
+  print(f"{len(df):,} entries -> {len(df_long):,} rows in {args.path_out}")
+  report_timings(timings)
+
+
+if __name__ == '__main__':
+  main()
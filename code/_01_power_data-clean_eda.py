@@ -4,66 +4,64 @@
 ## Load libraries
 import numpy as np
 import pandas as pd
-import inflection
 import re
 import matplotlib.pyplot as plt
 import seaborn as sns
-import os
+import sys
 import pickle
 
  
 
 # Read in Large Data File, Filter, and Re-Save======================================================
-## Data import
-# df0 = pd.read_csv('data/openipf-2024-10-12-b58b8e08.csv', low_memory=False)
-# 
-# 
-# ## Filter data
-# #get info
-# df0.shape #~1.3 million records
-# 
-# #filter data: men (18+) in 105 Kg weight class in US meets in last 4 years
-# df1 = df0.copy()
-# df1['year'] = pd.to_datetime(df0['Date']).dt.year
-# df2 = df1[(df1['MeetCountry']=="USA") & (df1['Sex']=='M') & (df1['WeightClassKg']=='105') &
-#            df1['year'].isin([2021, 2022, 2023, 2024]) & (df1['Age']>=18)]
-# df2.shape #~27 K records
+## Data import and filter
+#streams the ~1.3 million records in chunks (only needed cols, narrow dtypes) and keeps men (18+)
+  #in 105 Kg weight class in US meets in last 4 years (~27 K records)
+# sys.path.append('./code')
+# from _00_power_ingest import ingest_openipf, filter_default
+# df2 = ingest_openipf('data/openipf-2024-10-12-b58b8e08.csv', spec=filter_default)
 # 
 # ### Re-save file
 # df2.to_csv('data/openipf_2024-10-12_filtered.csv')
 # 
 # 
 # ## Data hygiene
-# del df0, df1, df2
+# del df2
+
+
+## Other (or several) divisions
+#one pass over the CSV; writes one wrangled file per slice to data/, e.g.:
+  #python code/_00_power_ingest.py data/openipf-2024-10-12-b58b8e08.csv --slice USA:M:105 \
+    #--slice USA:M:93 --slice USA:F:84 --years 2021 2022 2023 2024
 
 
 # Read in Filtered Data, Objects, and Functions=====================================================
 ## Data
-df = pd.read_csv('data/openipf_2024-10-12_filtered.csv')
+#first col is the row number in the source file (becomes id); read with the ingest dtypes so the meet
+  #fingerprints written with the data below match a new snapshot's
+#run from the repo root (like the data paths in this script)
+sys.path.append('./code')
+from _00_power_ingest import read_openipf_filtered, fingerprint_meets, filter_default
+df0 = read_openipf_filtered('data/openipf_2024-10-12_filtered.csv')
 
 
 ## Objects
 
 
 ## Functions
-root = '/Users/keithpost/Documents/Python/Python projects/power_dash_py/'
-os.chdir(root + 'code')
-from _00_power_fns import make_barplot_ncomps, make_hist, make_scatter, make_boxplot
-os.chdir(root)
+from _00_power_fns import get_ncomps_cube, lookup_ncomps
+from _00_power_eda import make_barplot_ncomps, make_hist, make_scatter, make_boxplot
+from _00_power_store import (write_power_data, write_lift_matrix, split_entries,
+                             write_meet_fingerprints)
+from _00_power_wrangle import prep_openipf, wrangle_openipf, report_timings, report_memory
 
 
 
 # Initial Cleaning==================================================================================
-## Rename first col and convert to snake case
-df.rename(columns={'Unnamed: 0': 'id'}, inplace=True)
-df.columns = df.columns.map(inflection.underscore).tolist()
-
-
-### Drop cols (that are the same for all rows) 
-#sex (all male), tested (all yes), sanctioned (all yes), parent_federation (all IPF), 
-  #meet_country (all USA), weight class (all 105)
-df = df.drop(columns=['sex', 'tested', 'sanctioned', 'parent_federation', 'meet_country', 
-                      'weight_class_kg'])
+## Move row number to id col, convert to snake case, and drop cols
+#drops cols that are the same for all rows--sex (all male), tested (all yes), sanctioned (all yes),
+  #parent_federation (all IPF), meet_country (all USA), weight class (all 105)--and bench, squat,
+  #and deadlift 4 (all missing)
+df = prep_openipf(df0)
 df.columns
 
 
@@ -80,7 +78,6 @@ df.info()
 
 ## Missingness 
 df.isnull().sum().sort_values(ascending=False) #0 - ~2421
-#remove bench, squat, and deadlift 4--all missing
 
 
 ## Duplicates
@@ -89,79 +86,32 @@ print(df.duplicated().sum()) #no duplicate rows
 
 
 # Secondary Wrangling===============================================================================
-## Drop columns with all missing data
-df.drop(['bench4_kg', 'deadlift4_kg', 'squat4_kg'], axis=1, inplace=True)
-
-
-## Pivot from wide to long for lifts
-#isolate columns
-cols_pivot = df.filter(regex='squat|bench|deadlift|^total_kg$').columns
-cols_id = df.columns[~df.columns.isin(cols_pivot)].to_list()
-
-#melt DF
-df_melt0 = pd.melt(df, id_vars=cols_id, value_vars=cols_pivot, 
-                   var_name='lift', value_name='mass_kg')
-
-#remove '_kg' suffix from lift categories 
-df_melt0['lift'] = df_melt0['lift'].str.replace(r'_kg$', '', regex=True)
-
-
-## Re-order columns
-#convert col index to list
-cols_melt0 = df_melt0.columns.to_list()
-
-#create list of cols to remove and remove them
-cols_to_remove = ['year', 'lift', 'mass_kg']
-cols_melt = [col for col in cols_melt0 if col not in cols_to_remove]
-
-#insert cols just removed
-cols_melt[9:9] = ['lift', 'mass_kg']
-cols_melt.insert(20, 'year')
-
-df_melt1 = df_melt0.reindex(columns=cols_melt)
-df_melt1.head()
-
-
-## Convert data types
-df_melt1.info()
-df_melt2 = df_melt1.copy()
-
-### Categorical variables
-#### Convert to categorical type
-cols_cat = ['event', 'equipment', 'age_class', 'birth_year_class', 'division', 'lift', 'place', 
-            'country', 'state', 'federation', 'meet_state', 'meet_town', 'meet_name']
-            
-df_melt2[cols_cat] = df_melt1[cols_cat].astype('category')
-
-
-#### Re-order variables
-##### lift
-#convert categories to list
-lifts_cat = df_melt2['lift'].cat.categories.tolist()
-
-#create new list of cats
-lifts_to_remove = ['best3_deadlift', 'best3_squat']
-lifts_new_cat = [cat for cat in lifts_cat if cat not in lifts_to_remove]
-
-lifts_new_cat.insert(7, 'best3_deadlift')
-lifts_new_cat.insert(11, 'best3_squat')
-
-#use new list as categories
-df_melt2['lift'] = df_melt2['lift'].cat.set_categories(lifts_new_cat)
-
-#place
-places_new_cat = list(range(1, 47)) + ['DD', 'DQ', 'G']
-places_new_cat = [str(cat) for cat in places_new_cat]
-
-df_melt2['place'] = df_melt2['place'].cat.set_categories(places_new_cat)
-
-
-### Date variable
-df_melt2['date'] = pd.to_datetime(df_melt2['date'])
+## Wrangle (see _00_power_wrangle)
+#wide lift matrix (one row per id, one col per lift) for lift-vs-lift plots and long DF (one row per
+  #id x lift) with cols and categories (lift, place) in their declared orders, categorical and date
+  #types, and compact dtypes: float64 -> float32 (lifts, body weights, and points have at most 3
+  #decimals) and int64 -> smallest int (id -> int32, year -> int16)
+timings = {}
+stages = {}
+df_melt2, lift_matrix = wrangle_openipf(df0, timings=timings, stages=stages)
+df_melt1 = stages['melt'] #before optimize_dtypes
+report_timings(timings)
+df_melt2.head()
+
+
+## Memory
+#entry attributes (age, wilks, meet_name, etc.) repeat once per lift (13x per entry), so the stored
+  #data keep them once per id in an entry table and only id, lift, mass_kg, and year per lift;
+  #compared with the long DF before optimize_dtypes
+df_entries, df_facts = split_entries(df_melt2)
+report_memory({'long': df_melt1}, {'entries': df_entries, 'facts': df_facts})
+del df_entries, df_facts, df_melt1, stages
 
 
 ## Data hygiene
-del df_melt1
+#meet fingerprints of the filtered data (written with the wrangled data) before dropping it
+meet_fps = fingerprint_meets(df0)
+del df0
 
 
 
@@ -172,31 +122,27 @@ df_melt2.info()
 
 ## Numbers of competitions by categorical variable/integer (univariate)--------------------
 ### Pandas
+#all counts in one pass: every categorical col x year (distinct ids, as with nunique)
+cube_ncomps = get_ncomps_cube(df_melt2)
+
 #sorted values
-df_melt2.groupby('event')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('equipment')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('age_class')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('birth_year_class')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('division')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('lift')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('place')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('country')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('state')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('federation')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('meet_state')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('meet_town')['id'].nunique().sort_values(ascending=False)
-df_melt2.groupby('meet_name')['id'].nunique().sort_values(ascending=False)
+for col in ['event', 'equipment', 'age_class', 'birth_year_class', 'division', 'lift', 'place',
+            'country', 'state', 'federation', 'meet_state', 'meet_town', 'meet_name']:
+  print(lookup_ncomps(cube_ncomps, col, sort=True))
+
+#by year
+cube_ncomps['event']
 
 #plots
-df_melt2.groupby('year')['id'].nunique().plot(kind='bar')
+lookup_ncomps(cube_ncomps, 'year').plot(kind='bar')
 plt.show()
 plt.close()
 
-df_melt2.groupby('event')['id'].nunique().sort_values(ascending=False).plot(kind='bar')
+lookup_ncomps(cube_ncomps, 'event', sort=True).plot(kind='bar')
 plt.show()
 plt.close()
 
-df_melt2.groupby('age_class')['id'].nunique().plot(kind='bar')
+lookup_ncomps(cube_ncomps, 'age_class').plot(kind='bar')
 plt.show()
 plt.close()
 
@@ -204,7 +150,7 @@ plt.close()
 ### Seaborn
 #### event
 #hard-coded
-s_event_ids = df_melt2.groupby('event')['id'].nunique().sort_values(ascending=False)
+s_event_ids = lookup_ncomps(cube_ncomps, 'event', sort=True)
 
 sns.barplot(x=s_event_ids.index, y=s_event_ids, order=s_event_ids.index)
 plt.show()
@@ -279,7 +225,7 @@ make_scatter(df_melt2, varx='age', vary='wilks')
 make_scatter(df_melt2, year=2024, varx='age', vary='wilks')
 make_scatter(df_melt2, varx='bodyweight_kg', vary='dots')
 
-make_scatter(df_melt2, liftx='best3_bench', lifty='best3_squat')
+make_scatter(df_melt2, liftx='best3_bench', lifty='best3_squat', lift_matrix=lift_matrix)
 make_scatter(df_melt2, varx='age', lifty='best3_bench')
 
 make_scatter(df_melt2, liftx='best3_bench', vary='bodyweight_kg')
@@ -314,7 +260,16 @@ make_boxplot(df=df_melt2, varx='year', vary='age')
 
 
 # Write Wrangled Data to File=======================================================================
-df_melt2.to_pickle('data/openipf-2024-10-12_filtered_wrangled')
+#parquet dataset partitioned by lift and year (keeps categorical dtypes) with entry attributes in a
+  #separate entry table (joined back by id on read)
+write_power_data(df_melt2, 'data/openipf-2024-10-12_filtered_wrangled.parquet', split=True)
+
+#meet fingerprints and the filter spec of the data (so _00_power_refresh can refresh it from a new
+  #snapshot)
+write_meet_fingerprints('data/openipf-2024-10-12_filtered_wrangled.parquet', meet_fps, filter_default)
+
+#lift matrix (memory-mappable .npy files)
+write_lift_matrix(lift_matrix, 'data/openipf-2024-10-12_filtered_wrangled_lifts')
 
 
  